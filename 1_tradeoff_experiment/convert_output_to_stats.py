@@ -7,6 +7,11 @@ import math
 from scipy.interpolate import make_interp_spline
 import csv
 from scipy.optimize import curve_fit
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from results_store import ResultsStore
 
 
 # def function(x, a, b, c):
@@ -208,8 +213,7 @@ def graphMe(xTicks, yValues0, yValues1, yValues2, experiment):
 
 
 experiment = "increasing_grid"
-pathHeuristicPaths = f"1_tradeoff_experiment/results/{experiment}_heuristic.csv"
-# pathHeuristicPaths = f"1_tradeoff_experiment/results/{experiment}_heuristic_neighbours_upper_limit.csv"
+pathResultsDatabase = "1_tradeoff_experiment/results/results.sqlite"
 
 depthLimits = []
 neighbourLimits = []
@@ -220,42 +224,46 @@ increasing_depths_runtime_dict = {}
 for i in range(10, 201, 10):
     increasing_depths_runtime_dict[i] = []
 
-with open(pathHeuristicPaths, "r") as file:
-    for line in file:
-        items = line.split(",")
+store = ResultsStore(pathResultsDatabase)
+runs = store.loadColumns("heuristic_runs", graph_type=experiment)
+store.close()
+
+limitPairs = []
+for depthLimit, neighbourLimit in zip(runs["depth_limit"].tolist(), runs["neighbour_limit"].tolist()):
+    if (depthLimit, neighbourLimit) not in limitPairs:
+        limitPairs.append((depthLimit, neighbourLimit))
 
-        depthLimit = items[0]
-        neighbourLimit = items[1]
+for depthLimit, neighbourLimit in limitPairs:
+    if depthLimit not in depthLimitDict:
+        depthLimitDict[depthLimit] = {}
 
-        if depthLimit not in depthLimitDict:
-            depthLimitDict[depthLimit] = {}
+    depthLimits.append(depthLimit)
+    neighbourLimits.append(neighbourLimit)
 
-        depthLimits.append(depthLimit)
-        neighbourLimits.append(neighbourLimit)
+    # Rows of this limit pair, ordered by PRO
+    selected = (runs["depth_limit"] == depthLimit) & (runs["neighbour_limit"] == neighbourLimit)
+    runtimes = runs["runtime"][selected].tolist()
+    improvements = runs["improvement"][selected]
+    ber = runs["ber"][selected]
 
-        runtimes = []
-        runtime_string = items[5].split("-")
-        for r in runtime_string:
-            if "e" in r:
-                r = "0.00001"
-            if r != "05":
-                runtimes.append(float(r))
+    # Same relative improvement as main.py: improvement / #BER, 0 for paths without BER
+    relativeImprovements = np.divide(improvements, ber, out=np.zeros(len(ber)), where=ber > 0)
 
-        for i in range(10, 201, 10):
-            # print("i:", i)
-            for j in range(i):
-                index = i - 10 + j
-                increasing_depths_runtime_dict[i].append(runtimes[j])
+    for i in range(10, 201, 10):
+        # print("i:", i)
+        for j in range(i):
+            index = i - 10 + j
+            increasing_depths_runtime_dict[i].append(runtimes[j])
 
 
 
-        neighbourLimitDict = {
-            "avg_improvement": float(items[2]),
-            "avg_relative_improvement": float(items[3]) * 100,
-            "avg_runtime": float(items[4]),
-            "runtimes": runtimes
-        }
-        depthLimitDict[depthLimit][neighbourLimit] =  neighbourLimitDict
+    neighbourLimitDict = {
+        "avg_improvement": round(float(improvements.mean()), 3),
+        "avg_relative_improvement": round(float(relativeImprovements.mean()), 3) * 100,
+        "avg_runtime": round(float(np.mean(runtimes)), 3),
+        "runtimes": runtimes
+    }
+    depthLimitDict[depthLimit][neighbourLimit] =  neighbourLimitDict
 
 
 xTicks = []
@@ -3,6 +3,10 @@ import json
 import copy
 import os
 import math
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bundles import BundleWriter
 
 # Tuning values
 
@@ -30,6 +34,9 @@ num_objects = 10
 
 dry_run = False
 
+# Write all PROs to one bundle (<output path>.jsonl.gz, see bundles.py) instead of one file per PRO
+write_bundle = False
+
 requirements = list(range(1, nr_of_features + 1))
 max_number_of_strict_requirements = 0
 max_nr_geolocations = 0
@@ -128,7 +135,16 @@ for index in range(num_objects):
 
     output_objects.append(data)
 
-if not dry_run:
+if not dry_run and write_bundle:
+    # The increasing_grid PROs are generated in batches, which are added to the same bundle
+    with BundleWriter(output_path + ".jsonl.gz", append=experiment == "increasing_grid") as bundle:
+        for obj in output_objects:
+            bundle.write(obj)
+elif not dry_run:
+    # main.py would read an old bundle instead of the new files
+    if os.path.exists(output_path + ".jsonl.gz"):
+        os.remove(output_path + ".jsonl.gz")
+
     # Print the generated JSON objects
     for i, obj in enumerate(output_objects):
         with open(f"{output_path}/pro_{(i + start_pro):03}.json", "w") as file:
@@ -2,6 +2,11 @@ from statistics import mean, median
 import matplotlib.pyplot as plt
 import numpy as np
 import math
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from results_store import ResultsStore
 
 
 
@@ -54,38 +59,51 @@ experiment = "as_graph"
 graphTitle = "AS Graph Network"
 
 
-pathFullPaths = f"2_comparison_experiment/results/{experiment}_global.csv"
-pathHeuristicPaths = f"2_comparison_experiment/results/{experiment}_heuristic.csv"
+pathResultsDatabase = "2_comparison_experiment/results/results.sqlite"
+
+# Global search whose runs are compared (the globalSearch of main.py), or None to use the only one
+# in the database
+globalSearch = None
 
 scoreFullPaths = {}
 scoreHeuristicPaths = {}
 
 nrOfItems = 100
-counter = 0
-with open(pathFullPaths, "r") as file:
-    for line in file:
-        if counter < 100:
-            counter += 1
-        else:
-            break
-
-        items = line.split(",")
-
-        scoreFullPaths[items[0]] = {
-            "hopcount": int(items[1]),
-            "nrBER": int(items[2]),
-            "runtime": float(items[3])
-        }
-
-with open(pathHeuristicPaths, "r") as file:
-    for line in file:
-        items = line.split(",")
-
-        scoreHeuristicPaths[items[0]] = {
-            "hopcount": int(items[1]),
-            "nrBER": int(items[2]),
-            "runtime": float(items[3])
-        }
+
+store = ResultsStore(pathResultsDatabase)
+if globalSearch is None:
+    # Runs of different searches must not be mixed, so there has to be exactly one
+    searches = sorted(set(store.loadColumns("global_runs", graph_type=experiment)["search"].tolist()))
+    if len(searches) > 1:
+        store.close()
+        sys.exit(f"global_runs holds runs of more than one search for {experiment} ({', '.join(searches)}), set globalSearch to one of them")
+    globalSearch = searches[0] if searches else ""
+# Only runs that finished are globally best; runs stopped by their deadline (or the hour per PRO)
+# hold the best path found so far, or #BER -1 if there was none
+globalRuns = store.loadColumns("global_runs", graph_type=experiment, search=globalSearch, optimal=1)
+unfinishedRuns = len(store.loadColumns("global_runs", graph_type=experiment, search=globalSearch)["pro"]) - len(globalRuns["pro"])
+if unfinishedRuns > 0:
+    print(f"skipping {unfinishedRuns} global runs of {experiment} that did not finish")
+heuristicRuns = store.loadColumns("heuristic_runs", graph_type=experiment)
+store.close()
+
+# Rows are ordered by PRO; only the first nrOfItems PROs are compared
+for pro, hops, ber, runtime in zip(globalRuns["pro"].tolist(), globalRuns["hops"].tolist(), globalRuns["ber"].tolist(), globalRuns["runtime"].tolist()):
+    if len(scoreFullPaths) >= nrOfItems:
+        break
+    scoreFullPaths[pro] = {
+        "hopcount": hops,
+        "nrBER": ber,
+        "runtime": runtime
+    }
+
+# With more than one limit pair, the last one (in key order) is compared
+for pro, hops, ber, runtime in zip(heuristicRuns["pro"].tolist(), heuristicRuns["hops"].tolist(), heuristicRuns["ber"].tolist(), heuristicRuns["runtime"].tolist()):
+    scoreHeuristicPaths[pro] = {
+        "hopcount": hops,
+        "nrBER": ber,
+        "runtime": runtime
+    }
 
 hopcountFull = []
 hopcountHeuristic = []
@@ -5,6 +5,10 @@ import os
 import random
 from highway_graph_generator import generateHighwayGraph
 from generate_features_distribution import generate_linear_features
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bundles import BundleWriter
 
 prefix = "2_comparison_experiment/"
 
@@ -28,6 +32,9 @@ if "uniform" in experiment or "linear" in experiment:
 
 dry_run = False
 
+# Write all NIO objects to one bundle (<output path>.jsonl.gz, see bundles.py) instead of one file per AS
+write_bundle = False
+
 # COMMENT/UNCOMMENT AS NEEDED
 
 output_path = ""
@@ -130,6 +137,13 @@ print("#connected components", len(list(nx.connected_components(G))))
 
 #################### SPIT OUT NIO FILES ###########################################
 
+bundle = None
+if write_bundle and not dry_run:
+    bundle = BundleWriter(output_path + ".jsonl.gz")
+elif not dry_run and os.path.exists(output_path + ".jsonl.gz"):
+    # main.py would read the old bundle instead of the new files
+    os.remove(output_path + ".jsonl.gz")
+
 for asn in list(G.nodes):
     node = G.nodes[asn]
     edges_local = []
@@ -148,8 +162,13 @@ for asn in list(G.nodes):
         "features": node["features"],
     }
 
-    if not dry_run:
+    if bundle is not None:
+        bundle.write(nio)
+    elif not dry_run:
         filename = f"{output_path}/nio_" + asn + ".json"
         with open(filename, "w") as file:
             output = json.dumps(nio, indent=2)
             file.write(output)
+
+if bundle is not None:
+    bundle.close()
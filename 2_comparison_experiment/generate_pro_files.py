@@ -2,6 +2,10 @@ import random
 import json
 import copy
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bundles import BundleWriter
 
 # Tuning values
 
@@ -24,6 +28,10 @@ num_objects = 200
 
 
 dry_run = False
+
+# Write all PROs to one bundle (<output path>.jsonl.gz, see bundles.py) instead of one file per PRO
+write_bundle = False
+
 if dry_run:
     print("DRY RUN")
 
@@ -110,7 +118,15 @@ for index in range(num_objects):
 
     output_objects.append(data)
 
-if not dry_run:
+if not dry_run and write_bundle:
+    with BundleWriter(output_path + ".jsonl.gz") as bundle:
+        for obj in output_objects:
+            bundle.write(obj)
+elif not dry_run:
+    # main.py would read an old bundle instead of the new files
+    if os.path.exists(output_path + ".jsonl.gz"):
+        os.remove(output_path + ".jsonl.gz")
+
     # Print the generated JSON objects
     for i, obj in enumerate(output_objects):
         with open(f"{output_path}/pro_{(i):03}.json", "w") as file:
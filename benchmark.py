@@ -0,0 +1,268 @@
+"""
+Reproducible benchmark of the path finding building blocks on seeded instances of every
+topology the experiments use.
+
+Every topology is generated from the same seed with the same generators and feature
+distributions as the generate_nio_files.py scripts, together with a fixed set of PROs. Every
+benchmark is then run warmup times (untimed) and repetitions times (timed) per PRO, and the
+timings are summarised as p50/p95/p99 in milliseconds.
+
+usage:
+    python benchmark.py [<output json>]                 run the benchmarks
+    python benchmark.py --compare <old json> <new json>  compare two runs, exit status 1 on a regression
+"""
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+import numpy as np
+import networkx as nx
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "2_comparison_experiment"))
+from highway_graph_generator import generateHighwayGraph
+from generate_features_distribution import generate_linear_features
+
+from csr_graph import CSRGraph
+from custom_shortest_path import berUpperBound, bidirectionalBFSWithFilter, bidirectionalBFSWithFilterCSR, buildStrictMask
+from feature_bits import addFeatureMasks, requirementBits
+from path_calculator import MP, augmentPathToBiggestSubset, find_best_detour, find_detours, globalBFS, globalBranchAndBound, globalLabelSetting, globalSubsetLattice, intersectionTables
+
+##########################################################################
+############# TWEAK HERE #################################################
+##########################################################################
+
+seed = 42
+
+# Sizes of the comparison experiment, plus a grid for the scaling experiment
+topologies = {
+    "as_graph": lambda: nx.random_internet_as_graph(500, seed=seed),
+    "as_graph_linear": lambda: nx.random_internet_as_graph(200, seed=seed),
+    "city": lambda: nx.grid_2d_graph(22, 23),
+    "flights": lambda: nx.powerlaw_cluster_graph(500, 6, 0.01, seed=seed),
+    "village": lambda: generateHighwayGraph(10, 10, 1, 4),
+    "increasing_grid": lambda: nx.grid_2d_graph(100, 100),
+}
+
+numberOfFeatures = 100
+minNrOfFeatures = 80
+numberOfPROs = 20
+bestEffortAmount = 20
+maxNumberOfStrictRequirements = 0
+
+limits = [2, 3]
+
+warmup = 2
+repetitions = 10
+
+# The exact searches can take very long, so they get fewer runs and a deadline per run. Runs that
+# hit the deadline are counted as timeouts and timed at the deadline.
+globalWarmup = 0
+globalRepetitions = 1
+globalTimeoutSeconds = 1
+
+# With --compare, a p50 or p95 that is this many times slower than before counts as a regression
+regressionThreshold = 1.25
+
+###########################################################################
+
+
+def buildGraph(name):
+    # Reseed per topology, such that every topology is the same regardless of which others are built
+    random.seed(seed)
+    G = topologies[name]()
+    G = nx.relabel_nodes(G, {n: str(n) for n in G.nodes})
+
+    if "linear" in name:
+        features = generate_linear_features(numberOfFeatures, 0, G.nodes, G)
+    else:
+        allFeatures = list(range(1, numberOfFeatures + 1))
+        features = {asn: random.sample(allFeatures, random.randint(minNrOfFeatures, numberOfFeatures)) for asn in G.nodes}
+
+    nx.set_node_attributes(G, {asn: {"features": features[asn]} for asn in G.nodes})
+    addFeatureMasks(G)
+    G.graph["csr"] = CSRGraph.fromNetworkx(G)
+    # As main.py does when it loads a graph
+    G.graph["csr"].buildFeatureComponents()
+    return G
+
+
+def buildPROs(G):
+    random.seed(seed)
+    nodes = list(G.nodes)
+    allFeatures = list(range(1, numberOfFeatures + 1))
+
+    pros = []
+    for _ in range(numberOfPROs):
+        source, destination = random.sample(nodes, 2)
+        strict = sorted(random.sample(allFeatures, random.randint(0, maxNumberOfStrictRequirements)))
+        bestEffort = sorted(random.sample([f for f in allFeatures if f not in strict], bestEffortAmount))
+        pro = {
+            "as_source": source,
+            "as_destination": destination,
+            "requirements": {"strict": strict, "best_effort": bestEffort, "best_effort_mode": "biggest_subset"},
+        }
+        # Same representation as main.py reads PRO files into
+        pros.append(json.loads(json.dumps(pro), object_hook=lambda pro_content: SimpleNamespace(**pro_content)))
+    return pros
+
+
+def benchmarkCases(G, pro):
+    """The calls to time for one PRO, as a dict from benchmark name to a function without arguments.
+
+    Everything a call needs but does not time itself (strict mask, shortest path, detour window)
+    is prepared here. Benchmarks that do not apply to the PRO, like a detour search on a path
+    without a bottleneck, are left out.
+    """
+    strictMask = buildStrictMask(G, pro)
+    _, ber = requirementBits(pro)
+
+    cases = {
+        "buildStrictMask": lambda: buildStrictMask(G, pro),
+        "berUpperBound": lambda: berUpperBound(G, pro),
+        "bidirectionalBFSWithFilter": lambda: bidirectionalBFSWithFilter(G, pro, strictMask),
+        "bidirectionalBFSWithFilterCSR": lambda: bidirectionalBFSWithFilterCSR(G, pro, strictMask),
+        "MP": lambda: MP(G, pro, limits),
+        "globalBFS": lambda: globalBFS(G, pro, deadline=time.time() + globalTimeoutSeconds),
+        "globalBranchAndBound": lambda: globalBranchAndBound(G, pro, deadline=time.time() + globalTimeoutSeconds),
+        "globalLabelSetting": lambda: globalLabelSetting(G, pro, deadline=time.time() + globalTimeoutSeconds),
+        "globalSubsetLattice": lambda: globalSubsetLattice(G, pro, deadline=time.time() + globalTimeoutSeconds),
+    }
+
+    path = bidirectionalBFSWithFilterCSR(G, pro, strictMask)
+    if len(path) == 0:
+        return cases
+
+    cases["augmentPathToBiggestSubset"] = lambda: augmentPathToBiggestSubset(G, pro, list(path), limits[0], limits[1], strictMask)
+
+    if len(path) >= 3:
+        # The first bottleneck MP looks at: the single node after the source
+        _, prefixBER, suffixBER = intersectionTables(G, path, ber)
+        bottleneckFreeBER = prefixBER[0] & suffixBER[2]
+        scoreToBeat = prefixBER[-1].bit_count()
+        cases["find_detours"] = lambda: find_detours(G, path[0], path[2], strictMask, path, limits[0], limits[1], [], [], bottleneckFreeBER)
+        cases["find_best_detour"] = lambda: find_best_detour(G, path[0], path[2], strictMask, path, limits[0], limits[1], bottleneckFreeBER, scoreToBeat)
+
+    return cases
+
+
+def timeCall(call, warmupRuns, timedRuns):
+    # Returns the timings in milliseconds and the result of the last call
+    for _ in range(warmupRuns):
+        call()
+    samples = []
+    result = None
+    for _ in range(timedRuns):
+        tic = time.perf_counter()
+        result = call()
+        samples.append((time.perf_counter() - tic) * 1000)
+    return samples, result
+
+
+def summarise(samples, timeouts):
+    samples = np.array(samples)
+    return {
+        "runs": len(samples),
+        "timeouts": timeouts,
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "mean_ms": round(float(samples.mean()), 4),
+        "max_ms": round(float(samples.max()), 4),
+    }
+
+
+def currentCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runBenchmarks():
+    results = {}
+    for name in topologies:
+        tic = time.time()
+        G = buildGraph(name)
+        pros = buildPROs(G)
+        print(f"{name}: {len(G.nodes)} nodes, {len(G.edges)} edges, built in {round(time.time() - tic, 3)} s")
+
+        samples = {}
+        timeouts = {}
+        for pro in pros:
+            for benchmark, call in benchmarkCases(G, pro).items():
+                if benchmark.startswith("global"):
+                    timings, result = timeCall(call, globalWarmup, globalRepetitions)
+                    # The exact searches return (path, #BER, optimal)
+                    timeouts[benchmark] = timeouts.get(benchmark, 0) + (not result[2])
+                else:
+                    timings, _ = timeCall(call, warmup, repetitions)
+                samples.setdefault(benchmark, []).extend(timings)
+
+        results[name] = {}
+        for benchmark, timings in samples.items():
+            results[name][benchmark] = summarise(timings, timeouts.get(benchmark, 0))
+            print(f"  {benchmark:32} p50 {results[name][benchmark]['p50_ms']:10.3f} ms   p95 {results[name][benchmark]['p95_ms']:10.3f} ms   p99 {results[name][benchmark]['p99_ms']:10.3f} ms")
+
+    return {
+        "commit": currentCommit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {
+            "seed": seed,
+            "numberOfPROs": numberOfPROs,
+            "bestEffortAmount": bestEffortAmount,
+            "maxNumberOfStrictRequirements": maxNumberOfStrictRequirements,
+            "limits": limits,
+            "warmup": warmup,
+            "repetitions": repetitions,
+            "globalRepetitions": globalRepetitions,
+            "globalTimeoutSeconds": globalTimeoutSeconds,
+        },
+        "results": results,
+    }
+
+
+def compareRuns(old, new):
+    """Print the change of every benchmark in both runs, and return whether any of them regressed."""
+    regressed = False
+    for name, benchmarks in new["results"].items():
+        for benchmark, summary in benchmarks.items():
+            if benchmark not in old["results"].get(name, {}):
+                continue
+            before = old["results"][name][benchmark]
+            ratios = [summary[p] / before[p] if before[p] > 0 else 1 for p in ["p50_ms", "p95_ms"]]
+            flag = ""
+            if max(ratios) >= regressionThreshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print(f"{name:16} {benchmark:32} p50 x{ratios[0]:6.2f}   p95 x{ratios[1]:6.2f}{flag}")
+
+    if old["settings"] != new["settings"]:
+        print("Note: the runs used different settings")
+    return regressed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--compare":
+        with open(sys.argv[2], "r") as file:
+            old = json.load(file)
+        with open(sys.argv[3], "r") as file:
+            new = json.load(file)
+        exit(1 if compareRuns(old, new) else 0)
+
+    report = runBenchmarks()
+
+    if len(sys.argv) > 1:
+        outputPath = sys.argv[1]
+    else:
+        outputPath = f"benchmark_results/{(report['commit'] or 'unknown')[:10]}.json"
+    os.makedirs(os.path.dirname(outputPath) or ".", exist_ok=True)
+    with open(outputPath, "w") as file:
+        json.dump(report, file, indent=2)
+    print("results written to", outputPath)
@@ -0,0 +1,89 @@
+"""
+A bundle stores a whole directory of NIO or PRO files as one file with one JSON record per line
+(JSON Lines), gzip-compressed when its name ends in ".gz". Records are written and read one at
+a time, so neither side ever holds more than one of them as text.
+
+By convention the bundle of the directory nio_files/city/ is nio_files/city.jsonl.gz (or
+nio_files/city.jsonl), see findBundle.
+
+usage: python bundles.py <directory of JSON files> <bundle file>
+"""
+
+import gzip
+import json
+import os
+import sys
+
+BUNDLE_EXTENSIONS = [".jsonl.gz", ".jsonl"]
+
+
+def openBundle(bundlePath, mode):
+    if bundlePath.endswith(".gz"):
+        return gzip.open(bundlePath, mode + "t", encoding="utf-8")
+    return open(bundlePath, mode, encoding="utf-8")
+
+
+class BundleWriter():
+    """Writes records to a bundle as they are produced.
+
+    With append=True, records are added after the ones already in the bundle (a gzip bundle then
+    gets an extra gzip member, which readers handle transparently).
+    """
+
+    def __init__(self, bundlePath, append=False):
+        os.makedirs(os.path.dirname(bundlePath) or ".", exist_ok=True)
+        self.file = openBundle(bundlePath, "a" if append else "w")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def writeBundle(records, bundlePath):
+    with BundleWriter(bundlePath) as writer:
+        for record in records:
+            writer.write(record)
+
+
+def readBundle(bundlePath, object_hook=None):
+    """Yield the records of a bundle in the order they were written.
+
+    object_hook is passed on to json.loads, so object_hook=lambda d: SimpleNamespace(**d) yields
+    the same objects main.py builds from separate files.
+    """
+    with openBundle(bundlePath, "r") as file:
+        for line in file:
+            if len(line.strip()) > 0:
+                yield json.loads(line, object_hook=object_hook)
+
+
+def findBundle(directory):
+    """The bundle belonging to a directory of JSON files, or None if there is none."""
+    base = directory.rstrip("/")
+    for extension in BUNDLE_EXTENSIONS:
+        if os.path.isfile(base + extension):
+            return base + extension
+    return None
+
+
+def readDirectory(directory):
+    # Same order as main.py reads a directory: PROs by the number in their name, NIOs in os.walk order
+    for _, _, files in os.walk(directory):
+        if all(f.startswith("pro_") for f in files):
+            files.sort(key=lambda f: int("".join(filter(str.isdigit, f))))
+        for file in files:
+            with open(os.path.join(directory, file), "r") as jsonFile:
+                yield json.load(jsonFile)
+
+
+if __name__ == "__main__":
+    writeBundle(readDirectory(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,193 @@
+"""
+Chain contraction: route on a graph in which every chain of degree-2 nodes is a single node.
+
+Highway graphs (see generateHighwayGraph) replace every road by a chain of intermediate nodes, so
+most of their nodes have exactly two neighbours and paths are long. A simple path that enters a
+chain has to follow it to the other end, so for routing a chain behaves like a single node that
+supports the features all of its nodes support. ChainIndex replaces every maximal chain by such a
+node, once per graph, after which the searches and MP's augmentation run on the much smaller
+contracted graph and only the path they return is expanded back into the chains.
+
+Sources and destinations have to be nodes of the contracted graph, so the chains are split at the
+terminals passed in (e.g. all endpoints of the PROs of an experiment). PROs with another endpoint
+inside a chain are solved on the whole graph.
+
+    index = ChainIndex(G, terminals)
+    path, ber, optimal = index.solve(globalBranchAndBound, pro, deadline=deadline)
+    hops, extraHops, ber, improvement, runtime, pathfinderTime, finished = index.MP(pro, limits)
+"""
+
+import time
+from csr_graph import CSRGraph
+from custom_shortest_path import buildStrictMask, fulfillsStrictRequirements
+from feature_bits import decodeFeatures
+from path_calculator import MP, MP_sweep, DetourSweep, augmentPathToBiggestSubset, shortestPath
+
+
+class ChainIndex():
+
+    def __init__(self, G, terminals=()):
+        self.G = G
+        terminals = set(terminals)
+        interior = {node for node in G.nodes if len(G.adj[node]) == 2 and node not in terminals and node not in G.adj[node]}
+
+        # Chain node id -> (end, interior nodes in order from that end, other end)
+        self.chains = {}
+        self.chainOf = {}
+        for node in G.nodes:
+            if node not in interior or node in self.chainOf:
+                continue
+            left, right = G.adj[node]
+            leftNodes, leftEnd = self.walk(node, left, interior)
+            if leftEnd == node:
+                # A cycle of degree-2 nodes only, which is left as it is
+                for other in leftNodes:
+                    interior.discard(other)
+                interior.discard(node)
+                continue
+            rightNodes, rightEnd = self.walk(node, right, interior)
+
+            chain = f"chain:{len(self.chains)}"
+            self.chains[chain] = (leftEnd, leftNodes[::-1] + [node] + rightNodes, rightEnd)
+            for other in self.chains[chain][1]:
+                self.chainOf[other] = chain
+
+        self.contracted = self.contract()
+
+    def walk(self, start, current, interior):
+        # Follow the chain from start through current, returning its nodes and the node it ends at
+        nodes = []
+        previous = start
+        while current in interior and current != start:
+            nodes.append(current)
+            previous, current = current, next(other for other in self.G.adj[current] if other != previous)
+        return nodes, current
+
+    def contract(self):
+        csr = self.G.graph["csr"]
+        keptIds = [asn for asn in csr.nodeIds if asn not in self.chainOf]
+        nodeIds = keptIds + list(self.chains)
+        index = {asn: i for i, asn in enumerate(nodeIds)}
+        featureLists = csr.featureLists()
+
+        def latency(u, v):
+            return csr.edgeLatency(csr.index[u], csr.index[v])
+
+        # The latency of a chain is put on the connection from its first end
+        chainLatency = {}
+        for chain, (end, nodes, otherEnd) in self.chains.items():
+            hops = [end] + nodes + [otherEnd]
+            chainLatency[(chain, end)] = sum(latency(u, v) for u, v in zip(hops[:-2], hops[1:-1]))
+            chainLatency[(chain, otherEnd)] = latency(nodes[-1], otherEnd)
+
+        adjacency = []
+        latencies = []
+        features = []
+        for asn in keptIds:
+            i = csr.index[asn]
+            neighbours = []
+            neighbourLatencies = []
+            for position in range(csr.indptr[i], csr.indptr[i + 1]):
+                other = csr.nodeIds[csr.indices[position]]
+                if other in self.chainOf:
+                    other = self.chainOf[other]
+                    nodeLatency = chainLatency[(other, asn)]
+                else:
+                    nodeLatency = float(csr.latency[position])
+                # A chain that starts and ends here is only connected once
+                if index[other] not in neighbours:
+                    neighbours.append(index[other])
+                    neighbourLatencies.append(nodeLatency)
+            adjacency.append(neighbours)
+            latencies.append(neighbourLatencies)
+            features.append(featureLists[i])
+
+        for chain, (end, nodes, otherEnd) in self.chains.items():
+            ends = [end] if end == otherEnd else [end, otherEnd]
+            adjacency.append([index[e] for e in ends])
+            latencies.append([chainLatency[(chain, e)] for e in ends])
+            mask = self.G.nodes[nodes[0]]["featureMask"]
+            for node in nodes[1:]:
+                mask &= self.G.nodes[node]["featureMask"]
+            features.append(decodeFeatures(mask))
+
+        return CSRGraph.fromAdjacency(nodeIds, adjacency, latencies, features).toNetworkx()
+
+    def covers(self, pro):
+        # Whether both endpoints of the PRO are nodes of the contracted graph
+        return pro.as_source not in self.chainOf and pro.as_destination not in self.chainOf
+
+    def contractPath(self, path):
+        contracted = []
+        for node in path:
+            node = self.chainOf.get(node, node)
+            if len(contracted) == 0 or contracted[-1] != node:
+                contracted.append(node)
+        return contracted
+
+    def expandPath(self, path):
+        expanded = []
+        for i, node in enumerate(path):
+            if node in self.chains:
+                end, nodes, _ = self.chains[node]
+                expanded.extend(nodes if path[i - 1] == end else nodes[::-1])
+            else:
+                expanded.append(node)
+        return expanded
+
+    def solve(self, search, pro, **kwargs):
+        """Run a search that returns (path, #BER, flag), like globalBFS, on the contracted graph."""
+        if not self.covers(pro):
+            return search(self.G, pro, **kwargs)
+        path, ber, flag = search(self.contracted, pro, **kwargs)
+        if not path:
+            return path, ber, flag
+        return self.expandPath(path), ber, flag
+
+    def MP(self, pro, limits, deadline=None):
+        """MP with the augmentation on the contracted graph, returning the same statistics as MP.
+
+        The shortest path to augment is still found on the whole graph, where a chain counts as
+        the number of hops it really has. The latency of a chain is on its connections in the
+        contracted graph, so detours through it are compared on their real latency.
+        """
+        if not self.covers(pro):
+            return MP(self.G, pro, limits, deadline)
+        return self.heuristic(pro, lambda path, strictMask, i: augmentPathToBiggestSubset(self.contracted, pro, path, limits[0], limits[1], strictMask, deadline=deadline))[0]
+
+    def MP_sweep(self, pro, limitsList):
+        if not self.covers(pro):
+            return MP_sweep(self.G, pro, limitsList)
+        # As in MP_sweep, the runtime of a limit pair leaves out the searches it shares with bigger limits
+        sweep = DetourSweep(limitsList)
+        order = sorted(range(len(limitsList)), key=lambda i: limitsList[i], reverse=True)
+        return self.heuristic(pro, lambda path, strictMask, i: augmentPathToBiggestSubset(self.contracted, pro, path, limitsList[i][0], limitsList[i][1], strictMask, sweep), order)
+
+    def heuristic(self, pro, augment, order=[0]):
+        # augment(contractedPath, strictMask, i) returns what augmentPathToBiggestSubset returns for
+        # the i-th result, and is called for every i in order
+        tic = time.time()
+        numberOfResults = len(order)
+
+        strictMask = buildStrictMask(self.G, pro)
+        if not fulfillsStrictRequirements(self.G, strictMask, pro.as_source) or not fulfillsStrictRequirements(self.G, strictMask, pro.as_destination):
+            return [(0, 0, 0)] * numberOfResults
+
+        timeBeforePath = time.time()
+        path = shortestPath(self.G, pro, strictMask)
+        timeAfterPath = time.time() - timeBeforePath
+
+        if len(path) == 0:
+            return [([], 0, time.time() - tic)] * numberOfResults
+
+        contractedPath = self.contractPath(path)
+        contractedStrictMask = buildStrictMask(self.contracted, pro)
+        sharedTime = time.time() - tic
+
+        results = [None] * numberOfResults
+        for i in order:
+            tic = time.time()
+            newPath, totalBER, improvement, finished = augment(list(contractedPath), contractedStrictMask, i)
+            newPath = self.expandPath(newPath)
+            results[i] = (len(newPath), len(newPath) - len(path), totalBER, improvement, sharedTime + time.time() - tic, timeAfterPath, finished)
+        return results
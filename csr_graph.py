@@ -0,0 +1,251 @@
+import numpy as np
+import networkx as nx
+
+
+class CSRGraph():
+    """Array representation of the routing graph.
+
+    Nodes are interned to integer indexes 0..n-1, in the order of nodeIds. The
+    neighbours of node i are indices[indptr[i]:indptr[i + 1]], with the latency of
+    each of those connections at the same positions in latency. The features of
+    node i are stored as a bitmap in row i of featureBits, where bit f is set when
+    the node supports feature f.
+    """
+
+    def __init__(self, nodeIds, indptr, indices, latency, featureBits):
+        self.nodeIds = nodeIds
+        self.index = {asn: i for i, asn in enumerate(nodeIds)}
+        self.indptr = indptr
+        self.indices = indices
+        self.latency = latency
+        self.featureBits = featureBits
+        self.featureIndex = None
+        self.componentIndex = {}
+        self.latencyIndex = None
+
+    def numberOfNodes(self):
+        return len(self.nodeIds)
+
+    def neighbours(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def edgeLatency(self, i, j):
+        # Latency of the connection from node i to node j, which has to exist
+        start = self.indptr[i]
+        return float(self.latency[start + int(np.flatnonzero(self.neighbours(i) == j)[0])])
+
+    def features(self, i):
+        bits = np.unpackbits(self.featureBits[i].view(np.uint8), bitorder="little")
+        return np.flatnonzero(bits).tolist()
+
+    def featureMask(self, i):
+        # Same bit layout as feature_bits.encodeFeatures
+        return int.from_bytes(self.featureBits[i].tobytes(), "little")
+
+    def featureLists(self):
+        # Decode all rows at once, which is much faster than calling features() per node
+        bits = np.unpackbits(self.featureBits.view(np.uint8), axis=1, bitorder="little")
+        rows, columns = np.nonzero(bits)
+        columns = columns.tolist()
+        ends = np.cumsum(np.bincount(rows, minlength=len(self.nodeIds))).tolist()
+        starts = [0] + ends[:-1]
+        return [columns[s:e] for s, e in zip(starts, ends)]
+
+    def featureNodes(self, f):
+        """Inverted index: the indexes of all nodes supporting feature f, built once on first use."""
+        if self.featureIndex is None:
+            bits = np.unpackbits(self.featureBits.view(np.uint8), axis=1, bitorder="little")
+            self.featureIndex = [np.flatnonzero(column) for column in bits.T]
+        if f >= len(self.featureIndex):
+            return np.zeros(0, dtype=np.int64)
+        return self.featureIndex[f]
+
+    def featureComponents(self, f):
+        """Component of every node in the subgraph of nodes supporting feature f, -1 for the other nodes.
+
+        Built once per feature on first use, see buildFeatureComponents to build them all up front.
+        """
+        if f not in self.componentIndex:
+            supportsFeature = np.zeros(len(self.nodeIds), dtype=bool)
+            supportsFeature[self.featureNodes(f)] = True
+            self.componentIndex[f] = self.components(supportsFeature)
+        return self.componentIndex[f]
+
+    def buildFeatureComponents(self, features=None):
+        # E.g. before forking worker processes, such that they share the components instead of each
+        # building their own. Builds those of the given features, or of all features by default.
+        if features is None:
+            features = range(self.featureBits.shape[1] * 64)
+        for f in features:
+            if len(self.featureNodes(f)) > 0:
+                self.featureComponents(f)
+
+    def components(self, allowed):
+        """Connected components of the subgraph of the nodes for which allowed is True.
+
+        Returns the lowest node index in the component of every allowed node, and -1 for the other
+        nodes. Union-find over all edges at once: every component root is hooked onto the lowest
+        root it is connected to, and pointer jumping then flattens the trees, until no edge
+        connects two components anymore.
+        """
+        n = len(self.nodeIds)
+        rows = np.repeat(np.arange(n), np.diff(self.indptr))
+        keep = allowed[rows] & allowed[self.indices]
+        u = rows[keep]
+        v = self.indices[keep].astype(np.int64)
+
+        label = np.arange(n)
+        while True:
+            labelU = label[u]
+            labelV = label[v]
+            different = labelU != labelV
+            if not different.any():
+                break
+            np.minimum.at(label, np.maximum(labelU, labelV)[different], np.minimum(labelU, labelV)[different])
+            while True:
+                jumped = label[label]
+                if np.array_equal(jumped, label):
+                    break
+                label = jumped
+
+        label[~allowed] = -1
+        return label
+
+    def latencyOrder(self):
+        """The neighbours and latencies of every node sorted by latency, built once on first use.
+
+        Returns (indices, latency) in the layout of self.indices and self.latency, such that the
+        connections of node i are still at positions indptr[i]:indptr[i + 1], from low to high latency.
+        """
+        if self.latencyIndex is None:
+            rows = np.repeat(np.arange(len(self.nodeIds)), np.diff(self.indptr))
+            order = np.lexsort((self.latency, rows))
+            self.latencyIndex = (self.indices[order], self.latency[order])
+        return self.latencyIndex
+
+    def strictMask(self, strictRequirements):
+        """Boolean array that is True for every node supporting all of the strict requirements.
+
+        The mask is computed per request and never stored on the graph, so one graph can serve
+        requests with different strict requirements at the same time.
+        """
+        strictRequirements = set(strictRequirements)
+        counts = np.zeros(len(self.nodeIds), dtype=np.int32)
+        for f in strictRequirements:
+            counts[self.featureNodes(f)] += 1
+        return counts == len(strictRequirements)
+
+    def supportMask(self, features):
+        """Boolean array that is True for every node supporting all features in the bitmask features."""
+        words = self.featureBits.shape[1]
+        if features >> (words * 64):
+            # Some feature is beyond the widest bitmap, so no node supports it
+            return np.zeros(len(self.nodeIds), dtype=bool)
+        required = np.frombuffer(features.to_bytes(words * 8, "little"), dtype=np.uint64)
+        return np.all(self.featureBits & required == required, axis=1)
+
+    def reachable(self, start, allowed):
+        """Boolean array of the nodes reachable from start using only nodes for which allowed is True."""
+        seen = np.zeros(len(self.nodeIds), dtype=bool)
+        if not allowed[start]:
+            return seen
+        seen[start] = True
+        frontier = np.array([start], dtype=np.int64)
+        while len(frontier) > 0:
+            starts = self.indptr[frontier]
+            counts = self.indptr[frontier + 1] - starts
+            offsets = np.cumsum(counts) - counts
+            positions = np.arange(int(counts.sum()), dtype=np.int64) + np.repeat(starts - offsets, counts)
+            neighbours = self.indices[positions]
+            neighbours = np.unique(neighbours[allowed[neighbours] & ~seen[neighbours]])
+            seen[neighbours] = True
+            frontier = neighbours
+        return seen
+
+    def subgraph(self, keep):
+        """The graph induced by the nodes for which the boolean array keep is True.
+
+        Nodes and the neighbours of every node stay in the same order.
+        """
+        n = len(self.nodeIds)
+        newIndex = np.cumsum(keep) - 1
+        rows = np.repeat(np.arange(n), np.diff(self.indptr))
+        keepEdge = keep[rows] & keep[self.indices]
+
+        indptr = np.zeros(int(keep.sum()) + 1, dtype=self.indptr.dtype)
+        indptr[1:] = np.cumsum(np.bincount(rows[keepEdge], minlength=n)[keep])
+        indices = newIndex[self.indices[keepEdge]].astype(self.indices.dtype)
+        nodeIds = [asn for asn, kept in zip(self.nodeIds, keep.tolist()) if kept]
+
+        return CSRGraph(nodeIds, indptr, indices, self.latency[keepEdge], self.featureBits[keep])
+
+    @classmethod
+    def fromAdjacency(cls, nodeIds, adjacency, latencies, features):
+        """Build from per-node lists, all indexed in the order of nodeIds.
+
+        adjacency[i] lists the neighbour indexes of node i, latencies[i] the
+        latency of each of those connections and features[i] the supported features.
+        """
+        n = len(nodeIds)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        for i in range(n):
+            indptr[i + 1] = indptr[i] + len(adjacency[i])
+
+        indices = np.fromiter((j for row in adjacency for j in row), dtype=np.int32, count=int(indptr[-1]))
+        latency = np.fromiter((l for row in latencies for l in row), dtype=np.float32, count=int(indptr[-1]))
+
+        counts = [len(f) for f in features]
+        rows = np.repeat(np.arange(n), counts)
+        columns = np.fromiter((f for row in features for f in row), dtype=np.int64, count=sum(counts))
+        words = int(columns.max()) // 64 + 1 if len(columns) > 0 else 1
+        bits = np.zeros((n, words * 64), dtype=bool)
+        bits[rows, columns] = True
+        featureBits = np.packbits(bits, axis=1, bitorder="little").view(np.uint64)
+
+        return cls(list(nodeIds), indptr, indices, latency, featureBits)
+
+    @classmethod
+    def fromNetworkx(cls, G):
+        """Build from a graph as constructed by main.py, keeping the neighbour order of G.adj."""
+        nodeIds = list(G.nodes)
+        index = {asn: i for i, asn in enumerate(nodeIds)}
+
+        adjacency = []
+        latencies = []
+        features = []
+        for asn in nodeIds:
+            neighbours = G.adj[asn]
+            adjacency.append([index[other] for other in neighbours])
+            latencies.append([neighbours[other].get("latency", 0) for other in neighbours])
+            features.append(G.nodes[asn].get("features", []))
+
+        return cls.fromAdjacency(nodeIds, adjacency, latencies, features)
+
+    def toNetworkx(self):
+        """Build the networkx graph that main.py expects from the arrays, with this CSRGraph in G.graph["csr"].
+
+        Nodes and the neighbours in G.adj keep the order of the arrays, so that searches on G and
+        on the arrays see the neighbours in the same order. Nodes only get their featureMask, the
+        feature lists can be read off the arrays with features() or featureLists().
+        """
+        G = nx.Graph(csr=self)
+        rowBytes = self.featureBits.shape[1] * 8
+        bitmap = self.featureBits.tobytes()
+        featureMasks = [int.from_bytes(bitmap[i * rowBytes:(i + 1) * rowBytes], "little") for i in range(len(self.nodeIds))]
+        G.add_nodes_from((asn, {"featureMask": featureMasks[i]}) for i, asn in enumerate(self.nodeIds))
+
+        # Filled row by row, as adding the edges would put the neighbours of a node in the order of
+        # the rows they are listed in. Both directions of an edge share one attribute dict, as in nx.Graph.
+        nodeIds = self.nodeIds
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        adj = G._adj
+        for i, asn in enumerate(nodeIds):
+            row = adj[asn]
+            for j in indices[indptr[i]:indptr[i + 1]]:
+                other = nodeIds[j]
+                reverse = adj[other]
+                row[other] = reverse[asn] if asn in reverse else {}
+
+        return G
@@ -1,20 +1,77 @@
+import heapq
+import time
+import numpy as np
+import profiling
+from feature_bits import decodeFeatures, requirementBits
 
-def fulfillsStrictRequirements(G, pro, node):
-    # If we encountered this node before and deemed it UNWORTHY, Call out the same sentence AGAIN!!!
 
-    if G.nodes[node]["filtered"]:
-        return False
+def buildStrictMask(G, pro):
+    # Decide for every node at once whether it is WORTHY of carrying this request. The verdict is
+    # kept per request instead of being carved into the shared graph, such that the next PRO with
+    # different strict requirements gets a fair trial, and requests can share one graph concurrently.
+    started = profiling.collector.start()
+    strictMask = G.graph["csr"].strictMask(pro.requirements.strict)
+    profiling.collector.stop("strict_check", started)
+    return strictMask
 
-    # Measure up this node's abilities to our utmost highly regarded standards of purity and honour,
-    # and only return true when this young padawan is WORTHY to meet our gaze
-    if set(pro.requirements.strict).issubset(set(G.nodes[node]["features"])):
-        return True
 
-    # Set those who are not deemed worthy with a MARK that will haunt them for the rest of
-    # their LIFE such that all that encounter these faulty ones later on will know what
-    # use they are to them and the rest of society.
-    G.nodes[node]["filtered"] = True
-    return False
+def fulfillsStrictRequirements(G, strictMask, node):
+    return strictMask[G.graph["csr"].index[node]]
+
+
+def berUpperBound(G, pro):
+    """Upper bound on the BER of any path for the PRO, as a bitmask.
+
+    A path can only keep feature f if all of its nodes support f, so if source and destination are
+    in the same component of the subgraph of nodes supporting f (see CSRGraph.featureComponents).
+    Unlike featureReachability, the components are the same for every PRO, so the bound costs a
+    lookup per feature, but it ignores the strict requirements.
+    """
+    csr = G.graph["csr"]
+    source = csr.index[pro.as_source]
+    destination = csr.index[pro.as_destination]
+
+    _, ber = requirementBits(pro)
+    bound = ber & csr.featureMask(source) & csr.featureMask(destination)
+    for f in decodeFeatures(bound):
+        components = csr.featureComponents(f)
+        if components[source] != components[destination]:
+            bound &= ~(1 << f)
+    return bound
+
+
+def featureReachability(G, strictMask, destination, features, deadline=None):
+    """For every node, the features f for which it can reach the destination through nodes that support f.
+
+    A path from a node to the destination can only keep feature f if the node is in the component
+    of the destination in the subgraph of (strict-filtered) nodes supporting f, so the result is
+    an upper bound on the BER any path through that node can keep. Returned as a list of feature
+    bitmasks indexed like G.graph["csr"], or None if the deadline (a time.time() value) passes
+    before every feature is done.
+    """
+    csr = G.graph["csr"]
+    n = csr.numberOfNodes()
+    target = csr.index[destination]
+
+    reachableFeatures = []
+    f = 0
+    while features >> f:
+        if (features >> f) & 1:
+            # One BFS per feature, which adds up on big graphs
+            if deadline is not None and time.time() >= deadline:
+                return None
+            supportsFeature = np.zeros(n, dtype=bool)
+            supportsFeature[csr.featureNodes(f)] = True
+            reachableFeatures.append((f, csr.reachable(target, supportsFeature & strictMask)))
+        f += 1
+
+    width = (f // 64 + 1) * 64
+    bits = np.zeros((n, width), dtype=bool)
+    for f, reachable in reachableFeatures:
+        bits[:, f] = reachable
+    rowBytes = width // 8
+    bitmap = np.packbits(bits, axis=1, bitorder="little").tobytes()
+    return [int.from_bytes(bitmap[i * rowBytes:(i + 1) * rowBytes], "little") for i in range(n)]
 
 
 
@@ -62,7 +119,7 @@ under the condition of copying with it the full license text. Thus, here it is:
    OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 """
-def find_predecessors_and_successors(G, pro):
+def find_predecessors_and_successors(G, pro, strictMask):
     """Bidirectional shortest path helper.
 
     Returns (pred, succ, w) where
@@ -93,9 +150,9 @@ def find_predecessors_and_successors(G, pro):
             thisLevel = forwardVisited
             forwardVisited = []
             for currentNode in thisLevel:
-                if fulfillsStrictRequirements(G, pro, currentNode):
+                if fulfillsStrictRequirements(G, strictMask, currentNode):
                     for neighbour in neighbours[currentNode]:
-                        if fulfillsStrictRequirements(G, pro, neighbour):
+                        if fulfillsStrictRequirements(G, strictMask, neighbour):
                             if neighbour not in pred:
                                 forwardVisited.append(neighbour)
                                 pred[neighbour] = currentNode
@@ -105,9 +162,9 @@ def find_predecessors_and_successors(G, pro):
             thisLevel = reverseVisited
             reverseVisited = []
             for currentNode in thisLevel:
-                if fulfillsStrictRequirements(G, pro, currentNode):
+                if fulfillsStrictRequirements(G, strictMask, currentNode):
                     for neighbour in neighbours[currentNode]:
-                        if fulfillsStrictRequirements(G, pro, neighbour):
+                        if fulfillsStrictRequirements(G, strictMask, neighbour):
                             if neighbour not in succ:
                                 reverseVisited.append(neighbour)
                                 succ[neighbour] = currentNode
@@ -119,9 +176,14 @@ def find_predecessors_and_successors(G, pro):
 
 
 
-def bidirectionalBFSWithFilter(G, pro):
+def bidirectionalBFSWithFilter(G, pro, strictMask=None):
+    if strictMask is None:
+        strictMask = buildStrictMask(G, pro)
+
     # call helper to do the real work
-    results = find_predecessors_and_successors(G, pro)
+    started = profiling.collector.start()
+    results = find_predecessors_and_successors(G, pro, strictMask)
+    profiling.collector.stop("shortest_path", started)
     pred, succ, meetupNode = results
 
     if len(pred) == 0 and len(succ) == 0 and meetupNode == -1:
@@ -142,4 +204,232 @@ def bidirectionalBFSWithFilter(G, pro):
         path.append(meetupNode)
         meetupNode = succ[meetupNode]
 
-    return path
\ No newline at end of file
+    return path
+
+
+"""
+Same bidirectional BFS as above, but over the integer-indexed CSR arrays of G.graph["csr"]
+instead of the G.adj dicts. Every level is expanded at once with NumPy, and the predecessors
+and successors are int32 arrays instead of dicts keyed by AS number.
+
+Nodes are visited in the same order as find_predecessors_and_successors visits them, so as long
+as the CSR neighbour order is the G.adj order (as for CSRGraph.fromNetworkx and for snapshots)
+both engines return identical paths.
+"""
+def expandLevel(csr, strictMask, thisLevel, visited, parents, otherVisited):
+    """Expand one BFS level in one direction.
+
+    Returns (nextLevel, meetupNode), where meetupNode is the first neighbour in scan order
+    that was already reached from the other side, or -1 if there is none.
+    """
+    starts = csr.indptr[thisLevel]
+    counts = csr.indptr[thisLevel + 1] - starts
+    total = int(counts.sum())
+
+    # Positions of all outgoing connections of this level in csr.indices, in scan order
+    levelOffsets = np.cumsum(counts) - counts
+    positions = np.arange(total, dtype=np.int64) + np.repeat(starts - levelOffsets, counts)
+    neighbours = csr.indices[positions]
+    currentNodes = np.repeat(thisLevel, counts)
+
+    allowed = strictMask[neighbours]
+    neighbours = neighbours[allowed]
+    currentNodes = currentNodes[allowed]
+
+    # A neighbour reached for the first time takes the node it was first reached from as parent
+    isNew = ~visited[neighbours]
+    _, firstSeen = np.unique(neighbours[isNew], return_index=True)
+    firstSeen = np.sort(np.flatnonzero(isNew)[firstSeen])
+    nextLevel = neighbours[firstSeen]
+    parents[nextLevel] = currentNodes[firstSeen]
+    visited[nextLevel] = True
+
+    met = np.flatnonzero(otherVisited[neighbours])
+    if len(met) > 0:
+        return nextLevel, int(neighbours[met[0]])
+
+    return nextLevel, -1
+
+
+def find_predecessors_and_successors_csr(csr, source, target, strictMask):
+    """CSR version of find_predecessors_and_successors.
+
+    Returns (pred, succ, w) where pred and succ are int32 arrays of parent indexes (-1 for
+    the source and target), or (None, None, -1) if there is no path.
+    """
+    n = csr.numberOfNodes()
+    pred = np.full(n, -1, dtype=np.int32)
+    succ = np.full(n, -1, dtype=np.int32)
+
+    if target == source:
+        return pred, succ, source
+
+    forwardSeen = np.zeros(n, dtype=bool)
+    reverseSeen = np.zeros(n, dtype=bool)
+    forwardSeen[source] = True
+    reverseSeen[target] = True
+
+    # The original checks each node of a level against the strict requirements before expanding
+    # it, which only matters for the source and target as all other nodes were checked on arrival
+    forwardVisited = np.array([source] if strictMask[source] else [], dtype=np.int32)
+    reverseVisited = np.array([target] if strictMask[target] else [], dtype=np.int32)
+
+    expanded = 0
+    while len(forwardVisited) > 0 and len(reverseVisited) > 0:
+        if len(forwardVisited) <= len(reverseVisited):
+            expanded += len(forwardVisited)
+            forwardVisited, meetupNode = expandLevel(csr, strictMask, forwardVisited, forwardSeen, pred, reverseSeen)
+        else:
+            expanded += len(reverseVisited)
+            reverseVisited, meetupNode = expandLevel(csr, strictMask, reverseVisited, reverseSeen, succ, forwardSeen)
+        if meetupNode != -1:
+            profiling.collector.count("bfs_nodes_expanded", expanded)
+            return pred, succ, meetupNode
+
+    profiling.collector.count("bfs_nodes_expanded", expanded)
+    return None, None, -1
+
+
+def bidirectionalBFSWithFilterCSR(G, pro, strictMask=None):
+    if strictMask is None:
+        strictMask = buildStrictMask(G, pro)
+
+    csr = G.graph["csr"]
+    source = csr.index[pro.as_source]
+    target = csr.index[pro.as_destination]
+
+    started = profiling.collector.start()
+    pred, succ, meetupNode = find_predecessors_and_successors_csr(csr, source, target, strictMask)
+    profiling.collector.stop("shortest_path", started)
+
+    if meetupNode == -1:
+        return []
+
+    return joinPath(csr, pred, succ, meetupNode)
+
+
+def joinPath(csr, pred, succ, meetupNode):
+    # build path from pred + meetupNode + succ
+    path = []
+
+    # from source to meetupNode
+    while meetupNode != -1:
+        path.append(meetupNode)
+        meetupNode = pred[meetupNode]
+    path.reverse()
+
+    # from w to target
+    meetupNode = succ[path[-1]]
+    while meetupNode != -1:
+        path.append(meetupNode)
+        meetupNode = succ[meetupNode]
+
+    return [csr.nodeIds[i] for i in path]
+
+
+def find_predecessors_and_successors_latency_csr(csr, source, target, strictMask):
+    """Weighted version of find_predecessors_and_successors_csr: bidirectional Dijkstra over csr.latency.
+
+    Both directions settle nodes in order of latency, the one with the smaller queue first, until
+    the lowest latencies in the two queues add up to at least the best path found. Instead of
+    pushing every neighbour of a settled node, which is slow for the hubs of AS graphs, the queue
+    holds one entry per settled node for its next connection in order of latency (see
+    CSRGraph.latencyOrder). Settling a node checks all its connections to nodes settled from the
+    other side at once. Returns (pred, succ, w) like the BFS version.
+    """
+    n = csr.numberOfNodes()
+    pred = np.full(n, -1, dtype=np.int32)
+    succ = np.full(n, -1, dtype=np.int32)
+
+    if not strictMask[source] or not strictMask[target]:
+        return None, None, -1
+    if target == source:
+        return pred, succ, source
+
+    indptr = csr.indptr
+    neighbours, latencies = csr.latencyOrder()
+    distances = [np.full(n, np.inf), np.full(n, np.inf)]
+    # Known before either side settles them, such that a side that reaches the other end first,
+    # e.g. on a path-shaped graph, sees the meeting there
+    distances[0][source] = 0
+    distances[1][target] = 0
+    parents = [pred, succ]
+    # Entries are (latency, position of the connection in neighbours, node it leaves from)
+    queues = [[(0.0, -1, source)], [(0.0, -1, target)]]
+    best = np.inf
+    meeting = None
+
+    expanded = 0
+    while len(queues[0]) > 0 and len(queues[1]) > 0 and queues[0][0][0] + queues[1][0][0] < best:
+        side = 0 if len(queues[0]) <= len(queues[1]) else 1
+        queue = queues[side]
+        here = distances[side]
+        distance, position, parent = heapq.heappop(queue)
+
+        if position == -1:
+            node = parent
+            parent = -1
+        else:
+            node = int(neighbours[position])
+            # The next connection of the parent takes its place in the queue
+            if position + 1 < indptr[parent + 1]:
+                heapq.heappush(queue, (here[parent] + float(latencies[position + 1]), position + 1, parent))
+            if here[node] != np.inf or not strictMask[node]:
+                continue
+
+        here[node] = distance
+        parents[side][node] = parent
+        expanded += 1
+
+        start = indptr[node]
+        stop = indptr[node + 1]
+        if start == stop:
+            continue
+        # Paths through a connection to a node settled from the other side, or through this node
+        through = distances[1 - side][neighbours[start:stop]] + latencies[start:stop] + distance
+        closest = int(np.argmin(through))
+        if through[closest] < best:
+            best = float(through[closest])
+            meeting = (side, node, int(neighbours[start + closest]))
+        if distance + distances[1 - side][node] < best:
+            best = distance + distances[1 - side][node]
+            meeting = (side, node, node)
+        heapq.heappush(queue, (distance + float(latencies[start]), int(start), node))
+
+    profiling.collector.count("bfs_nodes_expanded", expanded)
+    if meeting is None:
+        return None, None, -1
+
+    side, node, other = meeting
+    if other != node:
+        # Met over a connection: other is not settled on this side, so it can take node as parent
+        parents[side][other] = node
+    return pred, succ, other
+
+
+def bidirectionalLatencyWithFilterCSR(G, pro, strictMask=None):
+    """The path with the lowest total latency among the paths that fulfill the strict requirements."""
+    if strictMask is None:
+        strictMask = buildStrictMask(G, pro)
+
+    csr = G.graph["csr"]
+    source = csr.index[pro.as_source]
+    target = csr.index[pro.as_destination]
+
+    started = profiling.collector.start()
+    pred, succ, meetupNode = find_predecessors_and_successors_latency_csr(csr, source, target, strictMask)
+    profiling.collector.stop("shortest_path", started)
+
+    if meetupNode == -1:
+        return []
+
+    return joinPath(csr, pred, succ, meetupNode)
+
+
+def connectionLatencies(G, node):
+    # Latency of every connection of node, by neighbour
+    csr = G.graph["csr"]
+    i = csr.index[node]
+    start = csr.indptr[i]
+    stop = csr.indptr[i + 1]
+    return dict(zip([csr.nodeIds[j] for j in csr.indices[start:stop].tolist()], csr.latency[start:stop].tolist()))
@@ -0,0 +1,57 @@
+"""
+Features and requirements are small positive integers, so a set of them can be stored as one
+integer in which bit f is set when feature f is in the set. Subset checks and intersections
+then become a single AND, and the size of an intersection a popcount (int.bit_count).
+
+The bit layout is the same as that of the rows of CSRGraph.featureBits.
+"""
+
+
+def encodeFeatures(features):
+    mask = 0
+    for f in features:
+        mask |= 1 << f
+    return mask
+
+
+def decodeFeatures(mask):
+    features = []
+    while mask:
+        lowest = mask & -mask
+        features.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return features
+
+
+def requirementBits(pro):
+    """Return the (strict, best effort) requirements of a PRO as bitmasks.
+
+    The masks are computed once per PRO and stored on its requirements object.
+    """
+    requirements = pro.requirements
+    if not hasattr(requirements, "strictBits"):
+        requirements.strictBits = encodeFeatures(requirements.strict)
+        requirements.bestEffortBits = encodeFeatures(requirements.best_effort)
+    return requirements.strictBits, requirements.bestEffortBits
+
+
+def requirementScore(pro, ber):
+    """Score of a path that keeps the best effort requirements in the bitmask ber.
+
+    That is the number of them, or with best_effort_mode "ordered_list" the length of the longest
+    prefix of the list of best effort requirements that the path keeps.
+    """
+    if getattr(pro.requirements, "best_effort_mode", "biggest_subset") != "ordered_list":
+        return ber.bit_count()
+    length = 0
+    for f in pro.requirements.best_effort:
+        if not (ber >> f) & 1:
+            break
+        length += 1
+    return length
+
+
+def addFeatureMasks(G):
+    """Store the features of every node of G as a bitmask in its "featureMask" attribute."""
+    for node, data in G.nodes(data=True):
+        data["featureMask"] = encodeFeatures(data["features"])
@@ -0,0 +1,163 @@
+"""
+A snapshot stores a whole NIO directory in one file, such that a graph can be loaded
+without opening and parsing one JSON file per AS.
+
+Layout:
+    8 bytes     magic
+    8 bytes     length of the header (little-endian unsigned integer)
+    header      JSON describing every array: dtype, shape and offset from the start of the arrays
+    arrays      raw little-endian array data, each array aligned to ALIGNMENT bytes
+
+The arrays are the CSR adjacency (indptr, indices), the latency per connection, the
+feature bitmap matrix and the node ids, interned as one newline-separated utf-8 blob.
+"""
+
+import json
+import mmap
+import os
+import sys
+import numpy as np
+from bundles import readBundle
+from csr_graph import CSRGraph
+
+MAGIC = b"RBURSNP1"
+ALIGNMENT = 64
+
+
+def readNIOFiles(pathToNIOFiles):
+    """Yield the NIO objects in a directory (or a bundle) as plain dicts, in the same order main.py reads them."""
+    if os.path.isfile(pathToNIOFiles):
+        yield from readBundle(pathToNIOFiles)
+        return
+    for _, _, files in os.walk(pathToNIOFiles):
+        for file in files:
+            with open(os.path.join(pathToNIOFiles, file), "r") as nio_file:
+                yield json.load(nio_file)
+
+
+def buildCSRGraph(nioObjects):
+    """Intern the AS numbers of the NIO objects and build the CSR arrays.
+
+    Nodes and neighbours are put in the same order as in the graph main.py builds without a
+    snapshot, such that the searches break ties the same way on both: first the ASes with a NIO
+    object in the order they are read, then ASes that are only listed as a connection in the
+    order they are first listed. The neighbours of a node are in the order in which its
+    connections are first listed by either side, like adding them to an undirected nx.Graph.
+    """
+    # Read in a single pass, so the NIO objects can be streamed. An AS is interned when it is first
+    # seen, as a NIO object or as a connection, and put in its final place at the end, once it is
+    # known which ASes have a NIO object
+    seenIds = []
+    seenIndex = {}
+    adjacency = []
+    features = []
+    withNIO = []
+    hasNIO = set()
+
+    def intern(asn):
+        if asn not in seenIndex:
+            seenIndex[asn] = len(seenIds)
+            seenIds.append(asn)
+            adjacency.append({})
+            features.append([])
+        return seenIndex[asn]
+
+    for nio in nioObjects:
+        here = intern(nio["as_number"])
+        if here not in hasNIO:
+            hasNIO.add(here)
+            withNIO.append(here)
+        features[here] = nio["features"]
+
+        nioLatencies = nio.get("latency", [])
+        for position, other in enumerate(nio["connections"]):
+            there = intern(other)
+            latency = nioLatencies[position] if position < len(nioLatencies) else 0
+            if there not in adjacency[here]:
+                adjacency[here][there] = latency
+            if here not in adjacency[there]:
+                adjacency[there][here] = latency
+
+    # ASes with a NIO object in the order they are read, then the others in the order they are
+    # first listed
+    order = withNIO + [i for i in range(len(seenIds)) if i not in hasNIO]
+    renumber = {seen: final for final, seen in enumerate(order)}
+
+    nodeIds = [seenIds[i] for i in order]
+    neighbours = [[renumber[there] for there in adjacency[i]] for i in order]
+    latencies = [list(adjacency[i].values()) for i in order]
+    return CSRGraph.fromAdjacency(nodeIds, neighbours, latencies, [features[i] for i in order])
+
+
+def writeSnapshot(csr, snapshotPath):
+    arrays = {
+        "indptr": csr.indptr.astype("<i8"),
+        "indices": csr.indices.astype("<i4"),
+        "latency": csr.latency.astype("<f4"),
+        "featureBits": csr.featureBits.astype("<u8"),
+        "nodeIds": np.frombuffer("\n".join(csr.nodeIds).encode("utf-8"), dtype=np.uint8),
+    }
+
+    def align(offset):
+        return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    # Offsets are relative to the start of the data, which directly follows the (aligned) header
+    descriptions = {}
+    offset = 0
+    for name, array in arrays.items():
+        descriptions[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = align(offset + array.nbytes)
+
+    header = json.dumps({"arrays": descriptions}).encode("ascii")
+    dataStart = align(len(MAGIC) + 8 + len(header))
+
+    os.makedirs(os.path.dirname(snapshotPath) or ".", exist_ok=True)
+    with open(snapshotPath, "wb") as file:
+        file.write(MAGIC)
+        file.write(len(header).to_bytes(8, "little"))
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(dataStart + descriptions[name]["offset"])
+            file.write(array.tobytes())
+        file.truncate(dataStart + offset)
+
+
+def compileSnapshot(pathToNIOFiles, snapshotPath):
+    csr = buildCSRGraph(readNIOFiles(pathToNIOFiles))
+    writeSnapshot(csr, snapshotPath)
+    return csr
+
+
+def loadSnapshot(snapshotPath):
+    """Memory-map a snapshot and return it as a CSRGraph.
+
+    The numeric arrays are read-only views on the mapped file, so they are only paged in
+    from disk when they are used and are shared between processes that load the same file.
+    """
+    with open(snapshotPath, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{snapshotPath} is not a graph snapshot")
+
+    headerLength = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 8], "little")
+    header = json.loads(mapped[len(MAGIC) + 8:len(MAGIC) + 8 + headerLength])
+    dataStart = (len(MAGIC) + 8 + headerLength + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    arrays = {}
+    for name, description in header["arrays"].items():
+        dtype = np.dtype(description["dtype"])
+        shape = tuple(description["shape"])
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count, offset=dataStart + description["offset"]).reshape(shape)
+
+    nodeIds = []
+    if len(arrays["nodeIds"]) > 0:
+        nodeIds = arrays["nodeIds"].tobytes().decode("utf-8").split("\n")
+
+    return CSRGraph(nodeIds, arrays["indptr"], arrays["indices"], arrays["latency"], arrays["featureBits"])
+
+
+if __name__ == "__main__":
+    # usage: python graph_snapshot.py <path to NIO directory or bundle> <path to snapshot file>
+    compileSnapshot(sys.argv[1], sys.argv[2])
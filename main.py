@@ -1,10 +1,19 @@
-from path_calculator import MP, globalBFS
+from path_calculator import MP, MP_sweep, globalBFS, globalBranchAndBound, globalLabelSetting, globalSubsetLattice, paretoFrontier
+from graph_snapshot import compileSnapshot, loadSnapshot
+from feature_bits import encodeFeatures
+from csr_graph import CSRGraph
+from results_store import ResultsStore, heuristicRow
+from bundles import findBundle, readBundle
+from stub_pruning import StubIndex
+from chain_contraction import ChainIndex
+import profiling
 import os
 import json
 from types import SimpleNamespace
 import networkx as nx
-import signal
 import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 # test_path = "test_files"
 # test_nio_path = "test_files/nio_files/"
@@ -56,11 +65,114 @@ CHOSEN_PATH = comparison_experiment_path
 disableFullSearch = False
 disableHeuristic = True
 
+# Search used to find the globally optimal paths: "bfs" (the exhaustive globalBFS), "branch_and_bound",
+# "label_setting" or "subset_lattice". All give the same #BER, the latter three usually in a fraction
+# of the time. "subset_lattice" checks subsets of the BER instead of paths, which is fastest when the
+# PROs have few BER.
+#
+# PROs with best_effort_mode "ordered_list" are solved exactly by globalLongestPrefix instead, whichever
+# search is chosen (and MP does the same), and their #BER in the results is the length of the prefix
+# of the ordered best effort requirements that the path keeps.
+globalSearch = "branch_and_bound"
+
+# Number of worker processes the heuristic runs are spread over, 1 runs them one after the other
+# in this process. Results are written in the same order either way, but processes running at the
+# same time compete for cache and memory bandwidth, which makes the runtime of every run longer.
+# Keep this at 1 when the runtimes are measured, e.g. os.cpu_count() only to get the paths faster.
+numberOfProcesses = 1
+
+# Load the graph from a single snapshot file instead of one JSON file per AS. The snapshot is
+# (re)compiled from the NIO files whenever the NIO directory (or bundle) is newer than the snapshot.
+# Both give the same graph, down to the order of nodes and neighbours, and so the same paths. Mapping
+# the snapshot takes milliseconds; most of the load is building the networkx graph the searches run
+# on from it, about 2 s for a 250k-node grid.
+#
+# NIO and PRO files are read from a bundle (nio_files/<graphType>.jsonl.gz, see bundles.py) instead
+# of the directory whenever there is one.
+useGraphSnapshot = True
+
+# Run every PRO once for all limits in one sweep (MP_sweep) instead of once per limit pair. Gives
+# the same paths, but the runtime per limit pair then leaves out the searches it shared with
+# bigger limits, so keep this off when measuring the runtime of the limits themselves.
+useLimitSweep = False
+
+# Keep the results of earlier global search runs: PROs that already have a proven optimal path
+# in the results file are skipped, and PROs that ran out of time are run again, which continues
+# the search where it stopped when globalSearch is "bfs" (from a checkpoint that is saved every
+# checkpointIntervalSeconds). Set to False to start over with an empty results file.
+resumeGlobalSearch = True
+checkpointIntervalSeconds = 60
+
+# Record the time per phase and the search counters of every MP run in <graphType>_heuristic_profile.csv
+# next to the heuristic results. Not recorded with useLimitSweep, where the limits share their searches.
+profilePhases = False
+
+# Also store every run as a typed row in {CHOSEN_PATH}/results/results.sqlite (see results_store.py),
+# which is what the stats scripts read
+writeResultsDatabase = True
+
+# Peel the trees that hang off the rest of the graph (stub ASes and chains of them) and run every
+# search on what is left, the 2-core, with the tree paths of source and destination put back
+# afterwards (see stub_pruning.py). The global searches give the same #BER; MP can pick another
+# shortest path and other detours, as stubs no longer take up places among the neighbourLimit.
+pruneStubs = False
+
+# Replace every chain of degree-2 nodes by a single node (split at the endpoints of the PROs) and
+# run the global searches and MP's augmentation on the contracted graph (see chain_contraction.py).
+# The global searches give the same #BER. The limits of MP then count a chain as one hop, so the
+# same limits reach further than on the whole graph. Only used when pruneStubs is off.
+contractChains = False
+
+# Also write the trade-off between #BER, hops and latency of every PRO to <graphType>_pareto.csv: one
+# row per path that no other path beats on all three (see paretoFrontier), using the NIO latencies.
+# The search for a PRO stops after maxParetoPaths paths or paretoSecondsPerPRO seconds, after which
+# the rows found so far are written with 0 in the last column. Always runs on the whole graph.
+computeParetoFrontier = False
+maxParetoPaths = 50
+paretoSecondsPerPRO = 300
+
 ###########################################################################
 ###########################################################################
 ###########################################################################
 
 
+def runMP(task):
+    # Runs in a forked worker, which has the G, pro_objects and limit_entries of the parent
+    limitIndex, proIndex = task
+    profiling.collector.reset()
+    if routingIndex is not None:
+        result = routingIndex.MP(pro_objects[proIndex], limit_entries[limitIndex])
+    else:
+        result = MP(G, pro_objects[proIndex], limit_entries[limitIndex])
+    return result, profiling.collector.summary()
+
+
+def readNIOObjects(pathToNIOFiles):
+    # Streams the NIO objects of a bundle or of a directory with one file per AS
+    if os.path.isfile(pathToNIOFiles):
+        yield from readBundle(pathToNIOFiles, object_hook=lambda nio_content: SimpleNamespace(**nio_content))
+        return
+    for _,_,files in os.walk(pathToNIOFiles):
+        for file in files:
+            with open(pathToNIOFiles + file, "r") as nio_file:
+                nio_content = nio_file.read()
+                yield json.loads(nio_content, object_hook=lambda nio_content: SimpleNamespace(**nio_content))
+
+
+def runMPSweep(proIndex):
+    if routingIndex is not None:
+        return routingIndex.MP_sweep(pro_objects[proIndex], limit_entries)
+    return MP_sweep(G, pro_objects[proIndex], limit_entries)
+
+
+if profilePhases:
+    profiling.setCollector(profiling.PhaseCollector())
+
+resultsStore = None
+if writeResultsDatabase:
+    resultsStore = ResultsStore(f"{CHOSEN_PATH}/results/results.sqlite")
+
+
 
 for graphType in graphTypes:
     pathToNIOFiles = f"{CHOSEN_PATH}/nio_files/{graphType}/"
@@ -85,47 +197,89 @@ for graphType in graphTypes:
 
 
 
+    # Prefer bundles over directories of separate files
+    nioBundle = findBundle(pathToNIOFiles)
+    if nioBundle is not None:
+        pathToNIOFiles = nioBundle
+    proBundle = findBundle(pathToPROFiles)
+
     # Read in PRO objects
     pro_objects = []
 
-    for _, _, filenames in os.walk(pathToPROFiles):
-        filenames.sort(key=lambda f: int(''.join(filter(str.isdigit, f))))
-        for filename in filenames:
-            with open(pathToPROFiles + filename) as pro_file:
-                pro_content = pro_file.read()
-                pro_object = json.loads(pro_content, object_hook=lambda pro_content: SimpleNamespace(**pro_content))
-                pro_objects.append(pro_object)
+    if proBundle is not None:
+        pro_objects = list(readBundle(proBundle, object_hook=lambda pro_content: SimpleNamespace(**pro_content)))
+    else:
+        for _, _, filenames in os.walk(pathToPROFiles):
+            filenames.sort(key=lambda f: int(''.join(filter(str.isdigit, f))))
+            for filename in filenames:
+                with open(pathToPROFiles + filename) as pro_file:
+                    pro_content = pro_file.read()
+                    pro_object = json.loads(pro_content, object_hook=lambda pro_content: SimpleNamespace(**pro_content))
+                    pro_objects.append(pro_object)
 
 
     # Read NIO objects & build graph
-    nio_objects = []
-    as_numbers = []
-    node_info = {}
-    edges = []
-    edge_info = {}
-    for _,_,files in os.walk(pathToNIOFiles):
-            for file in files:
-                with open(pathToNIOFiles + file, "r") as nio_file:
-                    nio_content = nio_file.read()
-                    nio_object = json.loads(nio_content, object_hook=lambda nio_content: SimpleNamespace(**nio_content))
-
-                    as_numbers.append(nio_object.as_number)
-                    node_info[nio_object.as_number] = {
-                        "features": nio_object.features,
-                        "filtered": False
-                    }
-                    here = nio_object.as_number
-                    for index, other in enumerate(nio_object.connections):
-                        edges.append([here, other])
-
-    # Build graph
-    G = nx.Graph()
-    G.add_nodes_from(as_numbers)
-    nx.set_node_attributes(G, node_info)
-    G.add_edges_from(edges)
+    if useGraphSnapshot:
+        snapshotPath = f"{CHOSEN_PATH}/snapshots/{graphType}.snap"
+        if not os.path.exists(snapshotPath) or os.path.getmtime(snapshotPath) < os.path.getmtime(pathToNIOFiles):
+            print("compiling graph snapshot:", snapshotPath)
+            compileSnapshot(pathToNIOFiles, snapshotPath)
+        G = loadSnapshot(snapshotPath).toNetworkx()
+    else:
+        nio_objects = []
+        as_numbers = []
+        node_info = {}
+        edges = []
+        edge_info = {}
+        for nio_object in readNIOObjects(pathToNIOFiles):
+            as_numbers.append(nio_object.as_number)
+            node_info[nio_object.as_number] = {
+                "features": nio_object.features,
+                "featureMask": encodeFeatures(nio_object.features)
+            }
+            here = nio_object.as_number
+            latencies = getattr(nio_object, "latency", [])
+            for index, other in enumerate(nio_object.connections):
+                # Like compileSnapshot, the first NIO to list a connection sets its latency
+                if (here, other) in edge_info or (other, here) in edge_info:
+                    continue
+                edge_info[(here, other)] = {"latency": latencies[index] if index < len(latencies) else 0}
+                edges.append([here, other, edge_info[(here, other)]])
+
+        # Build graph
+        G = nx.Graph()
+        G.add_nodes_from(as_numbers)
+        nx.set_node_attributes(G, node_info)
+        G.add_edges_from(edges)
+        G.graph["csr"] = CSRGraph.fromNetworkx(G)
 
     print(len(G.nodes))
 
+    # Smaller graph to run the searches on, if any, with the same solve, MP and MP_sweep for all
+    routingIndex = None
+    if pruneStubs:
+        routingIndex = StubIndex(G)
+        print("2-core:", len(routingIndex.core.nodes), "nodes")
+    elif contractChains:
+        terminals = [pro.as_source for pro in pro_objects] + [pro.as_destination for pro in pro_objects]
+        routingIndex = ChainIndex(G, terminals)
+        print("contracted graph:", len(routingIndex.contracted.nodes), "nodes")
+
+    # The components per feature for the BER upper bound (see berUpperBound) are built on first
+    # use. Worker processes would each build their own, so before they are forked the components
+    # of the best effort features of the PROs are built here, such that they share them. The same
+    # goes for the connections sorted by latency, for PROs minimizing latency.
+    csrGraphs = [G.graph["csr"]]
+    if pruneStubs:
+        csrGraphs.append(routingIndex.core.graph["csr"])
+    elif contractChains:
+        csrGraphs.append(routingIndex.contracted.graph["csr"])
+    if numberOfProcesses > 1:
+        bestEffortFeatures = sorted({f for pro in pro_objects for f in pro.requirements.best_effort})
+        for csr in csrGraphs:
+            csr.buildFeatureComponents(bestEffortFeatures)
+            csr.latencyOrder()
+
 
 
     # Find full path
@@ -135,41 +289,87 @@ for graphType in graphTypes:
     if disableHeuristic:
         print("HEURISTIC IS DISABLED!")
     if "comparison" in CHOSEN_PATH and not disableFullSearch:
-        def handler(signum, frame):
-            raise Exception("end of time")
-
         # timePerPROSeconds = 300 # 5 minutes = 300 seconds
         timePerPROSeconds = 3600 # 1 hour
 
         print("Note: FINDING FULL PATH with slowpoke SMARTBFS. SO settle in cos this is going to take some time.....")
 
         outputFilePathGlobalSearch = f"{CHOSEN_PATH}/results/{graphType}_global.csv"
-
-        # reset file
-        open(outputFilePathGlobalSearch, "w")
+        checkpointDirectory = f"{CHOSEN_PATH}/checkpoints/{graphType}"
+
+        # Runtime of the last row per PRO, and whether that row was proven optimal. Rows written
+        # before the optimal column existed only contain finished searches.
+        earlierRuns = {}
+        if resumeGlobalSearch and os.path.exists(outputFilePathGlobalSearch):
+            with open(outputFilePathGlobalSearch, "r") as file:
+                for line in file:
+                    items = line.strip().split(",")
+                    if len(items) < 4:
+                        continue
+                    earlierRuns[int(items[0])] = (float(items[3]), len(items) < 5 or items[4] == "1")
+        else:
+            # reset file
+            open(outputFilePathGlobalSearch, "w")
 
         for i in range(len(pro_objects)):
-            signal.signal(signal.SIGALRM, handler)
-            signal.alarm(timePerPROSeconds)
+            previousRuntime = 0
+            if i in earlierRuns:
+                previousRuntime, finished = earlierRuns[i]
+                if finished:
+                    print(f"{graphType} - slowpoke pro:", i, "already done")
+                    continue
+
             print(f"{graphType} - slowpoke pro:", i)
-            try:
+            tic = time.time()
+            deadline = tic + timePerPROSeconds
+            searchArguments = {"deadline": deadline}
+            if globalSearch == "branch_and_bound":
+                search = globalBranchAndBound
+            elif globalSearch == "label_setting":
+                search = globalLabelSetting
+            elif globalSearch == "subset_lattice":
+                search = globalSubsetLattice
+            else:
+                search = globalBFS
+                searchArguments["checkpointPath"] = f"{checkpointDirectory}/pro_{i}.npz" if resumeGlobalSearch else None
+                searchArguments["checkpointInterval"] = checkpointIntervalSeconds
+            if routingIndex is not None:
+                Pb, totalNrOfBER, optimal = routingIndex.solve(search, pro_objects[i], **searchArguments)
+            else:
+                Pb, totalNrOfBER, optimal = search(G, pro_objects[i], **searchArguments)
+            # Total time spent on this PRO over all runs
+            runtime = time.time() - tic + previousRuntime
+            if not optimal:
+                print("too slow, keeping the best path found so far")
+            # The last column is 1 if the path is proven optimal, 0 if the search ran out of time.
+            # A PRO that is run again gets a new row, which replaces the earlier one.
+            with open(outputFilePathGlobalSearch, "a") as file:
+                file.write(f"{i},{len(Pb) if Pb else 0},{totalNrOfBER},{round(runtime, 3)},{int(optimal)}\n")
+            if resultsStore is not None:
+                resultsStore.addGlobalRuns([{
+                    "graph_type": graphType, "search": globalSearch, "pro": i,
+                    "hops": len(Pb) if Pb else 0, "ber": totalNrOfBER, "runtime": runtime, "optimal": int(optimal),
+                }])
+
+
+
+
+
+
+
+
+    if computeParetoFrontier:
+        print("Finding the Pareto frontier of every PRO")
+
+        outputFilePathPareto = f"{CHOSEN_PATH}/results/{graphType}_pareto.csv"
+        # pro, hops, latency, #BER, runtime, whether the frontier is complete
+        with open(outputFilePathPareto, "w") as file:
+            for i in range(len(pro_objects)):
                 tic = time.time()
-                Pb, totalNrOfBER = globalBFS(G, pro_objects[i])
+                frontier, complete = paretoFrontier(G, pro_objects[i], maxParetoPaths, tic + paretoSecondsPerPRO)
                 runtime = time.time() - tic
-                with open(outputFilePathGlobalSearch, "a") as file:
-                    file.write(f"{i},{len(Pb)},{totalNrOfBER},{round(runtime, 3)}\n")
-            except Exception as e:
-                print("too slow:", e)
-        # prevent signal from killing heuristic
-        signal.signal(signal.SIGALRM, handler)
-        signal.alarm(10000000)
-
-
-
-
-
-
-
+                for path, hops, latency, ber in frontier:
+                    file.write(f"{i},{hops},{round(latency, 3)},{ber},{round(runtime, 3)},{int(complete)}\n")
 
     if disableHeuristic:
         exit(0)
@@ -179,13 +379,37 @@ for graphType in graphTypes:
     # reset results file
     open(outputFilePathHeuristic, "w")
 
-    for current_limits in limit_entries:
+    outputFilePathProfile = f"{CHOSEN_PATH}/results/{graphType}_heuristic_profile.csv"
+    if profilePhases and not useLimitSweep:
+        with open(outputFilePathProfile, "w") as file:
+            file.write(",".join(["depth_limit", "neighbour_limit", "pro"] + profiling.PHASES + profiling.COUNTERS) + "\n")
+
+    # Run all (limits, PRO) combinations up front on all cores. The workers are forked after the
+    # graph is loaded, so they share its memory copy-on-write instead of each loading their own.
+    mpResults = {}
+    if useLimitSweep:
+        if numberOfProcesses > 1:
+            with ProcessPoolExecutor(max_workers=numberOfProcesses, mp_context=multiprocessing.get_context("fork")) as executor:
+                sweeps = list(executor.map(runMPSweep, range(len(pro_objects))))
+        else:
+            sweeps = [runMPSweep(proIndex) for proIndex in range(len(pro_objects))]
+        for proIndex, results in enumerate(sweeps):
+            for limitIndex, result in enumerate(results):
+                mpResults[(limitIndex, proIndex)] = (result, {})
+    elif numberOfProcesses > 1:
+        tasks = [(limitIndex, proIndex) for limitIndex in range(len(limit_entries)) for proIndex in range(len(pro_objects))]
+        with ProcessPoolExecutor(max_workers=numberOfProcesses, mp_context=multiprocessing.get_context("fork")) as executor:
+            for task, result in zip(tasks, executor.map(runMP, tasks)):
+                mpResults[task] = result
+
+    for limitIndex, current_limits in enumerate(limit_entries):
         with open(outputFilePathHeuristic, 'a') as file:
 
             improvements = []
             relative_improvements = []
             runtimes = []
             pathfinderTimes = []
+            storeRows = []
 
             print("current limits:", current_limits, ", map:", graphType)
 
@@ -193,12 +417,22 @@ for graphType in graphTypes:
                 print(graphType + " - pro", i)
                 pro = pro_objects[i]
 
-                totalHops, extraHops, totalNrOfBER, improvement, runtime, pathfinderTime = MP(G, pro, current_limits)
+                if len(mpResults) > 0:
+                    result, profile = mpResults[(limitIndex, i)]
+                else:
+                    result, profile = runMP((limitIndex, i))
+                totalHops, extraHops, totalNrOfBER, improvement, runtime, pathfinderTime, finished = result
+                storeRows.append(heuristicRow(graphType, current_limits, i, result, profile))
 
                 if "comparison" in CHOSEN_PATH:
                     comparison_result_string = f"{i},{totalHops},{totalNrOfBER},{round(runtime, 3)}\n"
                     file.write(comparison_result_string)
 
+                if len(profile) > 0:
+                    with open(outputFilePathProfile, "a") as profileFile:
+                        values = [round(profile[phase], 6) for phase in profiling.PHASES] + [profile[counter] for counter in profiling.COUNTERS]
+                        profileFile.write(",".join(str(v) for v in [current_limits[0], current_limits[1], i] + values) + "\n")
+
                 # print("pathfinderTime: ", pathfinderTime)
                 print("total time:", round(runtime, 3))
 
@@ -215,6 +449,9 @@ for graphType in graphTypes:
                     relative_improvements.append(0)
 
 
+            if resultsStore is not None:
+                resultsStore.addHeuristicRuns(storeRows)
+
             avg_improvement = round(sum(improvements) / len(improvements), 3)
             avg_relative_improvement = round(sum(relative_improvements) / len(relative_improvements), 3)
             avg_runtime = round(sum(runtimes) / len(runtimes), 3)
@@ -10,16 +10,30 @@ import time
 import math
 import queue
 import heapq
-from custom_shortest_path import bidirectionalBFSWithFilter, fulfillsStrictRequirements
-
-def MP(G, pro, limits):
+import multiprocessing
+import numpy as np
+from collections import deque
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+from custom_shortest_path import berUpperBound, bidirectionalBFSWithFilterCSR, bidirectionalLatencyWithFilterCSR, buildStrictMask, connectionLatencies, featureReachability, fulfillsStrictRequirements
+from feature_bits import decodeFeatures, encodeFeatures, requirementBits, requirementScore
+import profiling
+
+def MP(G, pro, limits, deadline=None):
+    """Find a path with the heuristic and return statistics about it.
+
+    deadline is an optional time.time() value at which the augmentation stops and the best path
+    found so far is used. The last value returned says whether MP finished before the deadline.
+    """
 
     tic = time.time()
 
     start = str(pro.as_source)
     end = str(pro.as_destination)
 
-    if not fulfillsStrictRequirements(G, pro, start) or not fulfillsStrictRequirements(G, pro, end):
+    strictMask = buildStrictMask(G, pro)
+
+    if not fulfillsStrictRequirements(G, strictMask, start) or not fulfillsStrictRequirements(G, strictMask, end):
         print("Either start or end did not fulfill the strict requirements, so no path could be found.")
         return 0, 0, 0
 
@@ -27,100 +41,382 @@ def MP(G, pro, limits):
     neighbourLimit = limits[1]
 
     timeBeforePath = time.time()
-    path = bidirectionalBFSWithFilter(G, pro)
+    path = shortestPath(G, pro, strictMask)
     timeAfterPath = time.time() - timeBeforePath
 
     if len(path) == 0:
         toc = time.time() - tic
         return [], 0, toc
 
-    newPath, totalBER, improvement = augmentPathToBiggestSubset(G, pro, path, depthLimit, neighbourLimit)
+    newPath, totalBER, improvement, finished = augmentPathToBiggestSubset(G, pro, path, depthLimit, neighbourLimit, strictMask, deadline=deadline)
 
     toc = time.time()
     runtime = toc - tic
 
-    return len(newPath), len(newPath) - len(path), totalBER, improvement, runtime, timeAfterPath
+    return len(newPath), len(newPath) - len(path), totalBER, improvement, runtime, timeAfterPath, finished
+
+
+def MP_sweep(G, pro, limitsList):
+    """MP for every limit pair in limitsList, with one shared shortest path and detour search.
+
+    Returns the tuple MP returns for each limit pair, in the order of limitsList. The runtime of
+    a limit pair only includes the detour searches it could not read off earlier ones, so it is
+    not comparable to the runtime of a separate MP run.
+    """
+    tic = time.time()
+
+    strictMask = buildStrictMask(G, pro)
+
+    if not fulfillsStrictRequirements(G, strictMask, pro.as_source) or not fulfillsStrictRequirements(G, strictMask, pro.as_destination):
+        return [(0, 0, 0) for limits in limitsList]
+
+    timeBeforePath = time.time()
+    path = shortestPath(G, pro, strictMask)
+    timeAfterPath = time.time() - timeBeforePath
+
+    if len(path) == 0:
+        toc = time.time() - tic
+        return [([], 0, toc) for limits in limitsList]
+
+    sweep = DetourSweep(limitsList)
+    sharedTime = time.time() - tic
+
+    # Biggest limits first, such that the smaller ones can read off its searches
+    results = [None] * len(limitsList)
+    for i in sorted(range(len(limitsList)), key=lambda i: limitsList[i], reverse=True):
+        tic = time.time()
+        newPath, totalBER, improvement, finished = augmentPathToBiggestSubset(G, pro, list(path), limitsList[i][0], limitsList[i][1], strictMask, sweep)
+        runtime = sharedTime + time.time() - tic
+        results[i] = (len(newPath), len(newPath) - len(path), totalBER, improvement, runtime, timeAfterPath, finished)
+
+    return results
+
+
+def augmentForBatch(G, strictMasks, index, pro, path, limits):
+    tic = time.time()
+    newPath, totalBER, improvement, _ = augmentPathToBiggestSubset(G, pro, path, limits[0], limits[1], strictMasks[frozenset(pro.requirements.strict)])
+    return index, newPath, totalBER, improvement, time.time() - tic
+
+
+# Graph and strict masks of the MP_batch that forked the worker process, set by initBatchWorker
+batchGraph = None
+batchStrictMasks = {}
+
+
+def initBatchWorker(G, strictMasks):
+    global batchGraph, batchStrictMasks
+    batchGraph = G
+    batchStrictMasks = strictMasks
+
+
+def augmentInBatchWorker(index, pro, path, limits):
+    return augmentForBatch(batchGraph, batchStrictMasks, index, pro, path, limits)
+
+
+def MP_batch(G, pros, limits, processes=None):
+    """Run MP for a list of PROs, sharing work between them.
+
+    Strict masks are computed once per distinct set of strict requirements, and the shortest
+    path once per group of PROs with the same source, destination and strict requirements.
+    The augmentation of every PRO is then spread over processes worker processes (all cores by
+    default, 1 runs everything in this process).
+
+    Returns the same tuple per PRO as MP, in the order of pros. The runtime and pathfinder time
+    of a PRO include its share of the work done once for its group.
+    """
+    strictMasks = {}
+    results = [None] * len(pros)
+    groups = {}
+    for i, pro in enumerate(pros):
+        key = (str(pro.as_source), str(pro.as_destination), frozenset(pro.requirements.strict), minimizesLatency(pro))
+        groups.setdefault(key, []).append(i)
+
+    tasks = []
+    sharedTimes = {}
+    for (start, end, strictKey, _), members in groups.items():
+        tic = time.time()
+        pro = pros[members[0]]
+        if strictKey not in strictMasks:
+            strictMasks[strictKey] = buildStrictMask(G, pro)
+        strictMask = strictMasks[strictKey]
+
+        if not fulfillsStrictRequirements(G, strictMask, start) or not fulfillsStrictRequirements(G, strictMask, end):
+            for i in members:
+                results[i] = (0, 0, 0)
+            continue
+
+        timeBeforePath = time.time()
+        path = shortestPath(G, pro, strictMask)
+        timeAfterPath = (time.time() - timeBeforePath) / len(members)
+        sharedTime = (time.time() - tic) / len(members)
+
+        if len(path) == 0:
+            for i in members:
+                results[i] = ([], 0, sharedTime)
+            continue
+
+        for i in members:
+            sharedTimes[i] = (sharedTime, timeAfterPath, path)
+            tasks.append((i, pros[i], path, limits))
+
+    if processes is None:
+        processes = os.cpu_count()
+
+    if processes == 1 or len(tasks) <= 1:
+        augmented = [augmentForBatch(G, strictMasks, *task) for task in tasks]
+    else:
+        # Forked workers share G and its indexes with this process copy-on-write, as long as the
+        # indexes are built before the fork; a worker that builds one lazily builds its own copy
+        csr = G.graph["csr"]
+        csr.featureNodes(0)
+        csr.buildFeatureComponents(sorted({f for pro in pros for f in pro.requirements.best_effort}))
+        csr.latencyOrder()
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("fork"),
+                                 initializer=initBatchWorker, initargs=(G, strictMasks)) as executor:
+            augmented = list(executor.map(augmentInBatchWorker, *zip(*tasks), chunksize=max(1, len(tasks) // (processes * 4))))
+
+    for i, newPath, totalBER, improvement, augmentTime in augmented:
+        sharedTime, timeAfterPath, path = sharedTimes[i]
+        results[i] = (len(newPath), len(newPath) - len(path), totalBER, improvement, sharedTime + augmentTime, timeAfterPath, True)
+
+    return results
+
+
+def heuristicPath(G, pro, limits, strictMask=None, deadline=None):
+    """The path MP finds, as (path, #BER, finished), or ([], -1, True) if there is no path.
+
+    finished is False if the deadline passed before the augmentation was done, in which case the
+    path is the best one found up to then.
+    """
+    if strictMask is None:
+        strictMask = buildStrictMask(G, pro)
 
+    if not fulfillsStrictRequirements(G, strictMask, pro.as_source) or not fulfillsStrictRequirements(G, strictMask, pro.as_destination):
+        return [], -1, True
 
+    path = shortestPath(G, pro, strictMask)
+    if len(path) == 0:
+        return [], -1, True
+
+    path, totalBER, _, finished = augmentPathToBiggestSubset(G, pro, path, limits[0], limits[1], strictMask, deadline=deadline)
+    return path, totalBER, finished
+
+
+
+
+
+def deadlinePassed(deadline):
+    # deadline is a time.time() value, or None for no deadline
+    return deadline is not None and time.time() >= deadline
+
+
+def isOrderedList(pro):
+    return getattr(pro.requirements, "best_effort_mode", "biggest_subset") == "ordered_list"
+
+
+def minimizesLatency(pro):
+    return getattr(pro, "path_optimization", "none") == "minimize_total_latency"
+
+
+def shortestPath(G, pro, strictMask=None):
+    # The path the heuristic starts from: the one with the fewest hops, or with the lowest total
+    # latency for PROs with path_optimization "minimize_total_latency"
+    if minimizesLatency(pro):
+        return bidirectionalLatencyWithFilterCSR(G, pro, strictMask)
+    return bidirectionalBFSWithFilterCSR(G, pro, strictMask)
+
+
+def longestPrefix(G, pro, strictMask, known=0, deadline=None):
+    """Longest prefix of the ordered best effort requirements that a path can keep, as (length, exact).
+
+    A path keeping a prefix exists if and only if the destination can be reached from the source
+    through nodes supporting the prefix, and a path keeping a prefix keeps every shorter one, so
+    the length is binary searched with one BFS over a node mask per step. known is a length that
+    is known to be possible, e.g. that of a path found before. exact is False if the deadline
+    passed, in which case the length is the longest one found to be possible up to then.
+    """
+    csr = G.graph["csr"]
+    source = csr.index[pro.as_source]
+    destination = csr.index[pro.as_destination]
+
+    # The prefix cannot extend past a feature the bound rules out
+    bound = berUpperBound(G, pro)
+    prefixes = [0]
+    for f in pro.requirements.best_effort:
+        if not (bound >> f) & 1:
+            break
+        prefixes.append(prefixes[-1] | 1 << f)
+
+    low = known
+    high = len(prefixes) - 1
+    while low < high:
+        if deadlinePassed(deadline):
+            return low, False
+        middle = (low + high + 1) // 2
+        if csr.reachable(source, strictMask & csr.supportMask(prefixes[middle]))[destination]:
+            low = middle
+        else:
+            high = middle - 1
+    return low, True
+
+
+def prefixPath(G, pro, strictMask, length):
+    # Shortest path keeping the first length ordered best effort requirements
+    prefix = encodeFeatures(pro.requirements.best_effort[:length])
+    return shortestPath(G, pro, strictMask & G.graph["csr"].supportMask(prefix))
+
+
+def augmentPathToLongestPrefix(G, pro, path, strictMask, deadline=None):
+    """augmentPathToBiggestSubset for PROs with best_effort_mode "ordered_list".
+
+    Replaces the path by the shortest path keeping the longest possible prefix of the ordered best
+    effort requirements, unless the path already keeps it. Returns the same (path, score,
+    improvement, finished), where the score is the length of the prefix (see requirementScore).
+    """
+    collector = profiling.collector
+    augmentStarted = collector.start()
 
+    _, ber = requirementBits(pro)
+    for node in path:
+        ber &= G.nodes[node]["featureMask"]
+    before = requirementScore(pro, ber)
 
+    length, finished = longestPrefix(G, pro, strictMask, before, deadline)
+    if length > before:
+        path = prefixPath(G, pro, strictMask, length)
 
-def augmentPathToBiggestSubset(G, pro, path, depthLimit, neighbourLimit):
+    collector.stop("augment", augmentStarted)
+    return path, length, length - before, finished
 
 
-    ber = set(pro.requirements.best_effort)
+def globalLongestPrefix(G, PRO, deadline=None):
+    """Exact search for PROs with best_effort_mode "ordered_list", see longestPrefix.
 
-    if(len(ber) == 0):
+    Returns (path, score, optimal) like globalBFS, where the score is the length of the prefix of
+    the ordered best effort requirements the path keeps.
+    """
+    strictMask = buildStrictMask(G, PRO)
+
+    if not fulfillsStrictRequirements(G, strictMask, PRO.as_source) or not fulfillsStrictRequirements(G, strictMask, PRO.as_destination):
+        return [], -1, True
+
+    path = bidirectionalBFSWithFilterCSR(G, PRO, strictMask)
+    if len(path) == 0:
+        return [], -1, True
+
+    length, optimal = longestPrefix(G, PRO, strictMask, deadline=deadline)
+    if length > 0:
+        path = prefixPath(G, PRO, strictMask, length)
+    return path, length, optimal
+
+
+def augmentPathToBiggestSubset(G, pro, path, depthLimit, neighbourLimit, strictMask=None, sweep=None, deadline=None):
+    # Returns (path, #BER, improvement, finished). The path is valid after every splice, so when
+    # the deadline passes the search stops and returns the path so far with finished False.
+    # No path can do better than berUpperBound, so the search also stops when the path reaches it.
+    # For PROs minimizing latency, detours with the same BER are told apart by their latency.
+
+    if strictMask is None:
+        strictMask = buildStrictMask(G, pro)
+
+    if isOrderedList(pro):
+        return augmentPathToLongestPrefix(G, pro, path, strictMask, deadline)
+
+    collector = profiling.collector
+    augmentStarted = collector.start()
+
+    _, ber = requirementBits(pro)
+
+    if ber == 0:
         # print("no BER so no improvement possible")
-        return path, 0, 0
+        collector.stop("augment", augmentStarted)
+        return path, 0, 0, True
 
     # Store original path and ber for comparison at the end
     originalPath = copy.deepcopy(path)
-    beforeBER = copy.deepcopy(ber)
+    beforeBER = ber
     for i in path:
-        beforeBER = beforeBER.intersection(G.nodes[i]["features"])
+        beforeBER &= G.nodes[i]["featureMask"]
 
 
-    if len(path) < 3:
+    bound = berUpperBound(G, pro)
+
+    if len(path) < 3 or beforeBER == bound:
         # print("path too short to optimize")
-        return path, len(beforeBER), 0
+        collector.stop("augment", augmentStarted)
+        return path, beforeBER.bit_count(), 0, True
 
 
     originalPath = copy.deepcopy(path)
+    minimizeLatency = minimizesLatency(pro)
+    position, prefixBER, suffixBER = intersectionTables(G, path, ber)
     detourDistances = range(2, len(originalPath))
+    finished = True
+    windowsScanned = 0
+    windowsSkipped = 0
+    detourSearches = 0
+    pathsSpliced = 0
+    scanStarted = collector.start()
     for detourDistance in detourDistances:
         for i in range(len(originalPath) - detourDistance):
-            if originalPath[i] in path and originalPath[i + detourDistance] in path:
-                startIndex = path.index(originalPath[i])
-                endIndex = path.index(originalPath[i + detourDistance])
+            if deadlinePassed(deadline):
+                finished = False
+                break
+            if originalPath[i] in position and originalPath[i + detourDistance] in position:
+                startIndex = position[originalPath[i]]
+                endIndex = position[originalPath[i + detourDistance]]
                 detourStart = path[startIndex]
                 detourEnd = path[endIndex]
-                bottleneck = path[startIndex + 1:endIndex]
-
-
-                bottleneckFreeBER = copy.deepcopy(ber)
-                for c in set(path).difference(set(bottleneck)):
-                    bottleneckFreeBER = bottleneckFreeBER.intersection(G.nodes[c]["features"])
 
-                currentPathBER = copy.deepcopy(ber)
-                for c in path:
-                    currentPathBER = currentPathBER.intersection(G.nodes[c]["features"])
+                # BER of the path without the bottleneck between detourStart and detourEnd
+                bottleneckFreeBER = prefixBER[startIndex] & suffixBER[endIndex]
+                currentPathBER = prefixBER[-1]
 
 
-                if len(bottleneckFreeBER) <= len(currentPathBER):
+                windowsScanned += 1
+                # No detour can keep more of it than the bound
+                if (bottleneckFreeBER & bound).bit_count() <= currentPathBER.bit_count():
                     # Nothing to improve here, skip this bottleneck
+                    windowsSkipped += 1
                     continue
 
-                detours = find_detours(G, detourStart, detourEnd, pro, path, depthLimit, neighbourLimit, [], [], bottleneckFreeBER)
-                # print(a, b)
-                # print("#detours", len(detours))
-                # print("detours:", detours)
-#
-                bestBER = copy.deepcopy(currentPathBER)
-                bestDetour = []
-                updatePath = False
-
-                for detour in detours:
-                    potentialBer = copy.deepcopy(bottleneckFreeBER)
-                    for j in detour:
-                        potentialBer = potentialBer.intersection(G.nodes[j]["features"])
-
-                    if len(potentialBer) > len(bestBER):
-                        bestDetour = detour
-                        bestBER = copy.deepcopy(potentialBer)
-                        updatePath = True
+                collector.stop("window_scan", scanStarted)
+                searchStarted = collector.start()
+                detourSearches += 1
+                detourFinder = find_best_detour if sweep is None else sweep.find_best_detour
+                bestDetour, bestBER = detourFinder(G, detourStart, detourEnd, strictMask, path, depthLimit, neighbourLimit, bottleneckFreeBER, currentPathBER.bit_count(), deadline, minimizeLatency)
+                updatePath = len(bestDetour) > 0
+                collector.stop("detour_search", searchStarted)
 
                 # Replace bottleneck with detour
                 if updatePath:
+                    validationStarted = collector.start()
                     potential_path = path[:startIndex + 1] + bestDetour + path[endIndex:]
 
                     # Ensure no silly mistakes were made
                     if nx.is_simple_path(G, potential_path):
                         path = potential_path
+                        position, prefixBER, suffixBER = intersectionTables(G, path, ber)
+                        pathsSpliced += 1
+                    collector.stop("validation", validationStarted)
+
+                scanStarted = collector.start()
+
+                if prefixBER[-1] == bound:
+                    break
+
+        if not finished or prefixBER[-1] == bound:
+            break
 
-    afterBER = copy.deepcopy(ber)
+    collector.stop("window_scan", scanStarted)
+
+    # A detour search that was cut short by the deadline may have missed the best detour
+    if deadlinePassed(deadline):
+        finished = False
+
+    afterBER = ber
     for i in path:
-        afterBER = afterBER.intersection(G.nodes[i]["features"])
+        afterBER &= G.nodes[i]["featureMask"]
 
     # if beforeBER != afterBER:
     #     print("ber before:", beforeBER)
@@ -130,13 +426,44 @@ def augmentPathToBiggestSubset(G, pro, path, depthLimit, neighbourLimit):
     # else:
     #     print("----")
 
-    return path, len(afterBER), len(afterBER) - len(beforeBER)
+    if collector.enabled:
+        collector.count("windows_scanned", windowsScanned)
+        collector.count("windows_skipped", windowsSkipped)
+        collector.count("detour_searches", detourSearches)
+        collector.count("paths_spliced", pathsSpliced)
+    collector.stop("augment", augmentStarted)
+
+    return path, afterBER.bit_count(), afterBER.bit_count() - beforeBER.bit_count(), finished
+
+
 
+def intersectionTables(G, path, ber):
+    """Running intersections over a path, to get the BER of any part of it with one AND.
+
+    prefixBER[k] is ber intersected with the features of path[0..k] and suffixBER[k] the
+    intersection of the features of path[k..], so the BER of the path without the nodes
+    strictly between index a and b is prefixBER[a] & suffixBER[b].
+    """
+    position = {}
+    prefixBER = []
+    current = ber
+    for index, node in enumerate(path):
+        position[node] = index
+        current &= G.nodes[node]["featureMask"]
+        prefixBER.append(current)
+
+    suffixBER = [0] * len(path)
+    current = -1 # all bits set
+    for index in range(len(path) - 1, -1, -1):
+        current &= G.nodes[path[index]]["featureMask"]
+        suffixBER[index] = current
+
+    return position, prefixBER, suffixBER
 
 
 def limit_neighbours(G, neighbours, neighbourLimit, bottleneckFreeBER):
 
-    sortedNeighbours = sorted(neighbours, key = lambda x: len(set(G.nodes[x]["features"]).intersection(set(bottleneckFreeBER))), reverse=True)
+    sortedNeighbours = sorted(neighbours, key = lambda x: (G.nodes[x]["featureMask"] & bottleneckFreeBER).bit_count(), reverse=True)
 
     if len(neighbours) > neighbourLimit:
         neighbours = sortedNeighbours[:neighbourLimit]
@@ -147,7 +474,7 @@ def limit_neighbours(G, neighbours, neighbourLimit, bottleneckFreeBER):
     return neighbours
 
 
-def find_detours(G, detourStart, detourEnd, PRO, path, depthLimit, neighbourLimit, prefix, postfix, bottleneckFreeBER):
+def find_detours(G, detourStart, detourEnd, strictMask, path, depthLimit, neighbourLimit, prefix, postfix, bottleneckFreeBER):
     # print(detourStart, detourEnd)
 
     if depthLimit == 0:
@@ -164,7 +491,7 @@ def find_detours(G, detourStart, detourEnd, PRO, path, depthLimit, neighbourLimi
     shared_neighbours = set(startNeighbours).intersection(set(endNeighbours))
 
     for i in shared_neighbours:
-        if fulfillsStrictRequirements(G, PRO, i):
+        if fulfillsStrictRequirements(G, strictMask, i):
             detours.append(prefix + [i] + postfix)
 
 
@@ -172,7 +499,7 @@ def find_detours(G, detourStart, detourEnd, PRO, path, depthLimit, neighbourLimi
     for s in startNeighbours:
         for e in endNeighbours:
 
-            if fulfillsStrictRequirements(G, PRO, s) and fulfillsStrictRequirements(G, PRO, e):
+            if fulfillsStrictRequirements(G, strictMask, s) and fulfillsStrictRequirements(G, strictMask, e):
                 if s != e and len(set([s, e]).intersection(set(path + prefix + postfix))) == 0:
 
                     # If the prefix and postfix are connected, they form a 2-node detour
@@ -182,43 +509,393 @@ def find_detours(G, detourStart, detourEnd, PRO, path, depthLimit, neighbourLimi
                     newPrefix = prefix + [s]
                     newPostfix = [e] + postfix
 
-                    detours = detours + find_detours(G, s, e, PRO, path, depthLimit - 1, neighbourLimit, newPrefix, newPostfix, bottleneckFreeBER)
+                    detours = detours + find_detours(G, s, e, strictMask, path, depthLimit - 1, neighbourLimit, newPrefix, newPostfix, bottleneckFreeBER)
 
     return detours
 
 
+def grow_half_detours(G, root, strictMask, path, depthLimit, neighbourLimit, bottleneckFreeBER, scoreToBeat, deadline=None, minimizeLatency=False):
+    """All half-detours of at most depthLimit nodes that start next to root.
+
+    Every step keeps the neighbourLimit best neighbours, like find_detours does, and drops a
+    half-detour as soon as its BER can no longer beat scoreToBeat, since adding nodes only
+    shrinks the BER. Returns a dict from the last node of each half-detour to a list of
+    (nodes, ber, rank, latency) tuples, where rank is the smallest neighbourLimit that still keeps
+    every node of the half-detour, and latency is that of the connections from root to the last
+    node (only summed with minimizeLatency, 0 otherwise). When the deadline passes, the halves
+    found so far are returned.
+    """
+    pathNodes = set(path)
+    halves = {}
+    latencies = {}
+    frontier = [((), bottleneckFreeBER, 0, root, 0)]
+    intersections = 0
+    halfDetours = 0
+
+    for depth in range(depthLimit):
+        if deadlinePassed(deadline):
+            break
+        nextFrontier = []
+        for nodes, halfBER, halfRank, last, halfLatency in frontier:
+            if deadlinePassed(deadline):
+                break
+            neighbours = [n for n in G.adj[last] if n not in pathNodes and n not in nodes and fulfillsStrictRequirements(G, strictMask, n)]
+            if minimizeLatency and last not in latencies:
+                latencies[last] = connectionLatencies(G, last)
+            for rank, n in enumerate(limit_neighbours(G, neighbours, neighbourLimit, bottleneckFreeBER), 1):
+                newBER = halfBER & G.nodes[n]["featureMask"]
+                intersections += 1
+                if newBER.bit_count() <= scoreToBeat:
+                    continue
+                newNodes = nodes + (n,)
+                newRank = max(halfRank, rank)
+                newLatency = halfLatency + latencies[last][n] if minimizeLatency else 0
+                nextFrontier.append((newNodes, newBER, newRank, n, newLatency))
+                halves.setdefault(n, []).append((newNodes, newBER, newRank, newLatency))
+                halfDetours += 1
+        frontier = nextFrontier
+
+    if profiling.collector.enabled:
+        profiling.collector.count("set_intersections", intersections)
+        profiling.collector.count("half_detours", halfDetours)
+
+    return halves
+
+
+def find_best_detour(G, detourStart, detourEnd, strictMask, path, depthLimit, neighbourLimit, bottleneckFreeBER, scoreToBeat, deadline=None, minimizeLatency=False):
+    """Meet-in-the-middle replacement of find_detours.
+
+    Instead of recursing over every pair of start and end neighbours, half-detours are grown
+    once from both ends and joined by hashing on their last node: two halves ending in the same
+    node, or in two adjacent nodes, form a detour. Halves of unequal length are joined as well,
+    and it takes far fewer enumerations.
+
+    Ties between equally good neighbours are broken in the order of G.adj, where find_detours
+    uses the iteration order of a set, so on ties the two can find different detours.
+
+    Returns the detour with the biggest BER, preferring shorter detours on ties (or, with
+    minimizeLatency, detours with a lower latency from detourStart to detourEnd), together with
+    its BER. Returns ([], 0) if no detour beats scoreToBeat. When the deadline passes, the best
+    detour found so far is returned.
+    """
+    startHalves = grow_half_detours(G, detourStart, strictMask, path, depthLimit, neighbourLimit, bottleneckFreeBER, scoreToBeat, deadline, minimizeLatency)
+    if len(startHalves) == 0:
+        return [], 0
+    endHalves = grow_half_detours(G, detourEnd, strictMask, path, depthLimit, neighbourLimit, bottleneckFreeBER, scoreToBeat, deadline, minimizeLatency)
+
+    bestDetour = []
+    bestBER = 0
+    bestScore = scoreToBeat
+    bestCost = 0
+    joined = 0
+
+    for last, halves in startHalves.items():
+        if deadlinePassed(deadline):
+            break
+        # Halves from the end that meet this one in the same node or in a neighbour
+        if minimizeLatency:
+            latencies = connectionLatencies(G, last)
+            meetings = [(last, True, 0)] + [(n, False, latencies[n]) for n in G.adj[last]]
+        else:
+            meetings = [(last, True, 0)] + [(n, False, 0) for n in G.adj[last]]
+        for meetupNode, shared, meetupLatency in meetings:
+            if meetupNode not in endHalves:
+                continue
+            joined += len(halves) * len(endHalves[meetupNode])
+            for startNodes, startBER, _, startLatency in halves:
+                for endNodes, endBER, _, endLatency in endHalves[meetupNode]:
+                    detourBER = startBER & endBER
+                    score = detourBER.bit_count()
+                    # Detours with the same BER are compared on their length, or on their latency
+                    if minimizeLatency:
+                        cost = startLatency + meetupLatency + endLatency
+                    else:
+                        cost = len(startNodes) + len(endNodes) - shared
+                    if score < bestScore or (score == bestScore and (score == scoreToBeat or cost >= bestCost)):
+                        continue
+
+                    if shared:
+                        detour = list(startNodes) + list(reversed(endNodes[:-1]))
+                    else:
+                        detour = list(startNodes) + list(reversed(endNodes))
+
+                    # Both halves avoid the path, but they should also avoid each other
+                    if len(set(detour)) != len(detour):
+                        continue
+
+                    bestDetour = detour
+                    bestBER = detourBER
+                    bestScore = score
+                    bestCost = cost
+
+    if profiling.collector.enabled:
+        # Every joined pair of halves is one candidate detour and one intersection
+        profiling.collector.count("detours_enumerated", joined)
+        profiling.collector.count("set_intersections", joined)
+
+    return bestDetour, bestBER
+
+
+def find_best_detours_per_limit(G, detourStart, detourEnd, strictMask, path, depthLimit, neighbourLimit, bottleneckFreeBER, scoreToBeat, deadline=None, minimizeLatency=False):
+    """find_best_detour for every limit pair up to (depthLimit, neighbourLimit) at once.
+
+    With smaller limits, the search only keeps a subset of the half-detours of the search with
+    the biggest limits: the halves of at most that many nodes whose nodes all rank within the
+    smaller neighbourLimit. So every detour is tagged with the smallest (depthLimit, neighbourLimit)
+    that finds it, and the best detour is kept per tag. Use best_detour_within_limits to read off
+    the best detour for a limit pair.
+    """
+    startHalves = grow_half_detours(G, detourStart, strictMask, path, depthLimit, neighbourLimit, bottleneckFreeBER, scoreToBeat, deadline, minimizeLatency)
+    if len(startHalves) == 0:
+        return {}
+    endHalves = grow_half_detours(G, detourEnd, strictMask, path, depthLimit, neighbourLimit, bottleneckFreeBER, scoreToBeat, deadline, minimizeLatency)
+
+    bestPerTag = {}
+    joined = 0
+
+    for last, halves in startHalves.items():
+        if deadlinePassed(deadline):
+            break
+        if minimizeLatency:
+            latencies = connectionLatencies(G, last)
+            meetings = [(last, True, 0)] + [(n, False, latencies[n]) for n in G.adj[last]]
+        else:
+            meetings = [(last, True, 0)] + [(n, False, 0) for n in G.adj[last]]
+        for meetupNode, shared, meetupLatency in meetings:
+            if meetupNode not in endHalves:
+                continue
+            joined += len(halves) * len(endHalves[meetupNode])
+            for startNodes, startBER, startRank, startLatency in halves:
+                for endNodes, endBER, endRank, endLatency in endHalves[meetupNode]:
+                    detourBER = startBER & endBER
+                    score = detourBER.bit_count()
+                    if score <= scoreToBeat:
+                        continue
+
+                    tag = (max(len(startNodes), len(endNodes)), max(startRank, endRank))
+                    if minimizeLatency:
+                        cost = startLatency + meetupLatency + endLatency
+                    else:
+                        cost = len(startNodes) + len(endNodes) - shared
+                    if tag in bestPerTag:
+                        bestScore, bestCost, _, _ = bestPerTag[tag]
+                        if score < bestScore or (score == bestScore and cost >= bestCost):
+                            continue
+
+                    if shared:
+                        detour = list(startNodes) + list(reversed(endNodes[:-1]))
+                    else:
+                        detour = list(startNodes) + list(reversed(endNodes))
+
+                    if len(set(detour)) != len(detour):
+                        continue
+
+                    bestPerTag[tag] = (score, cost, detour, detourBER)
+
+    if profiling.collector.enabled:
+        profiling.collector.count("detours_enumerated", joined)
+        profiling.collector.count("set_intersections", joined)
+
+    return bestPerTag
+
+
+def best_detour_within_limits(bestPerTag, depthLimit, neighbourLimit):
+    bestScore = 0
+    bestCost = 0
+    bestDetour = []
+    bestBER = 0
+    for (depthNeeded, neighbourLimitNeeded), (score, cost, detour, detourBER) in bestPerTag.items():
+        if depthNeeded > depthLimit or neighbourLimitNeeded > neighbourLimit:
+            continue
+        if score > bestScore or (score == bestScore and cost < bestCost):
+            bestScore, bestCost, bestDetour, bestBER = score, cost, detour, detourBER
+    return bestDetour, bestBER
+
+
+class DetourSweep():
+    """Shares detour searches between augmentations of the same PRO with different limits.
+
+    Every window is searched once with the biggest limits of the sweep, and the result is kept
+    per (window, current path). As long as the augmentations for different limits have spliced
+    in the same detours so far, the smaller limits read their detour off that result instead of
+    searching again.
+    """
+
+    def __init__(self, limitsList):
+        self.depthLimit = max(limits[0] for limits in limitsList)
+        self.neighbourLimit = max(limits[1] for limits in limitsList)
+        self.searches = {}
+
+    def find_best_detour(self, G, detourStart, detourEnd, strictMask, path, depthLimit, neighbourLimit, bottleneckFreeBER, scoreToBeat, deadline=None, minimizeLatency=False):
+        key = (detourStart, detourEnd, tuple(path))
+        if key not in self.searches:
+            self.searches[key] = find_best_detours_per_limit(G, detourStart, detourEnd, strictMask, path, self.depthLimit, self.neighbourLimit, bottleneckFreeBER, scoreToBeat, deadline, minimizeLatency)
+        return best_detour_within_limits(self.searches[key], depthLimit, neighbourLimit)
+
+
 ###################################################################
 
 
 
-def globalBFS(G, PRO):
-    if not fulfillsStrictRequirements(G, PRO, PRO.as_source) or not fulfillsStrictRequirements(G, PRO, PRO.as_destination):
-        return [], -1
+def checkpointKey(G, PRO):
+    # Identifies the PRO a checkpoint belongs to, and the graph, which is not always the whole
+    # graph (see stub_pruning.py and chain_contraction.py)
+    return [str(PRO.as_source), str(PRO.as_destination), sorted(PRO.requirements.strict), sorted(PRO.requirements.best_effort), G.number_of_nodes(), G.number_of_edges()]
+
+
+def saveCheckpoint(checkpointPath, state, arrays):
+    # The state as JSON next to the integer arrays, in one .npz file. Written to a temporary file
+    # first, such that a crash while writing leaves the old checkpoint intact.
+    os.makedirs(os.path.dirname(checkpointPath) or ".", exist_ok=True)
+    temporaryPath = checkpointPath + ".tmp"
+    with open(temporaryPath, "wb") as file:
+        np.savez(file, state=np.array(json.dumps(state)), **arrays)
+    os.replace(temporaryPath, checkpointPath)
+
+
+def loadCheckpoint(checkpointPath, G, PRO):
+    """The (state, arrays) saved in checkpointPath, or None if there is none for this PRO."""
+    if not os.path.exists(checkpointPath):
+        return None
+    try:
+        with np.load(checkpointPath) as data:
+            state = json.loads(str(data["state"]))
+            arrays = {name: data[name] for name in data.files if name != "state"}
+    except (ValueError, OSError, KeyError):
+        # Not a checkpoint in this format, e.g. one of an earlier version
+        return None
+    if state.get("pro") != checkpointKey(G, PRO):
+        return None
+    return state, arrays
+
+
+def linkPath(link):
+    # A path stored as nested (node, parent link, ber) tuples, as in globalBFS
+    path = []
+    while link is not None:
+        path.append(link[0])
+        link = link[1]
+    path.reverse()
+    return path
+
+
+def linkContains(link, node):
+    while link is not None:
+        if link[0] == node:
+            return True
+        link = link[1]
+    return False
+
+
+def globalBFS(G, PRO, deadline=None, checkpointPath=None, checkpointInterval=60):
+    # Returns (path, #BER, optimal). When the deadline (a time.time() value) passes, the search
+    # stops and returns the best path found so far with optimal False.
+    #
+    # Paths are stored as links (node, parent link, BER of the path up to node), so the paths in
+    # the queue share their common prefixes instead of each being a copy.
+    #
+    # With a checkpointPath, the queue, the best path so far and the counters are saved there
+    # every checkpointInterval seconds and when the deadline passes, and a later call for the
+    # same PRO continues from the checkpoint. The checkpoint stores every link the queue refers to
+    # once, as the node index and the index of the parent link, and every queue entry as a node
+    # index and the index of the link before it; the BER of the links is recomputed when loading.
+    # It is removed once the search is done.
+    #
+    # PROs with best_effort_mode "ordered_list" are handed to globalLongestPrefix, as in the other
+    # global searches.
+    if isOrderedList(PRO):
+        return globalLongestPrefix(G, PRO, deadline)
+
+    strictMask = buildStrictMask(G, PRO)
+
+    if not fulfillsStrictRequirements(G, strictMask, PRO.as_source) or not fulfillsStrictRequirements(G, strictMask, PRO.as_destination):
+        return [], -1, True
 
     BglobalBestSCore = -1 # globally [b]est set of best effort requirements
     Pb = 0 # globally [b]est path, corresponding to Bb
 
-    Q = []
-    Q.append((PRO.as_source, [], PRO.requirements.best_effort))
+    _, ber = requirementBits(PRO)
+    bestPossibleScore = berUpperBound(G, PRO).bit_count()
+
+    # (node, link of the path before it), the link being None for the source
+    Q = deque()
+    expanded = 0
+
+    checkpoint = None
+    if checkpointPath is not None:
+        checkpoint = loadCheckpoint(checkpointPath, G, PRO)
+
+    csr = G.graph["csr"]
+
+    if checkpoint is not None:
+        state, arrays = checkpoint
+        # Parents come before their children in the table
+        links = []
+        for node, parent in zip(arrays["linkNodes"].tolist(), arrays["linkParents"].tolist()):
+            node = csr.nodeIds[node]
+            parent = links[parent] if parent >= 0 else None
+            links.append((node, parent, (ber if parent is None else parent[2]) & G.nodes[node]["featureMask"]))
+        Q.extend((csr.nodeIds[node], links[parent] if parent >= 0 else None) for node, parent in zip(arrays["queueNodes"].tolist(), arrays["queueParents"].tolist()))
+        BglobalBestSCore = state["bestScore"]
+        Pb = state["bestPath"]
+        expanded = state["expanded"]
+    else:
+        Q.append((PRO.as_source, None))
+
+    def saveState():
+        index = {}
+        linkNodes = []
+        linkParents = []
+        for _, link in Q:
+            # Number the links up to the first one that already has an index, root first
+            chain = []
+            while link is not None and id(link) not in index:
+                chain.append(link)
+                link = link[1]
+            for link in reversed(chain):
+                index[id(link)] = len(linkNodes)
+                linkNodes.append(csr.index[link[0]])
+                linkParents.append(index[id(link[1])] if link[1] is not None else -1)
+        arrays = {
+            "linkNodes": np.array(linkNodes, dtype=np.int32),
+            "linkParents": np.array(linkParents, dtype=np.int64),
+            "queueNodes": np.array([csr.index[node] for node, _ in Q], dtype=np.int32),
+            "queueParents": np.array([index[id(link)] if link is not None else -1 for _, link in Q], dtype=np.int64),
+        }
+        state = {"pro": checkpointKey(G, PRO), "bestScore": BglobalBestSCore, "bestPath": Pb, "expanded": expanded}
+        saveCheckpoint(checkpointPath, state, arrays)
+
+    lastCheckpoint = time.time()
 
     while not len(Q) == 0:
-        vc, Pp, Bp = Q.pop(0) # Remove and return the first item from the queue
+        if deadlinePassed(deadline):
+            if checkpointPath is not None:
+                saveState()
+            return Pb, BglobalBestSCore, False
+
+        if checkpointPath is not None and time.time() - lastCheckpoint >= checkpointInterval:
+            saveState()
+            lastCheckpoint = time.time()
 
-        Pc = copy.deepcopy(Pp)
-        Pc.append(vc)
+        vc, Pp = Q.popleft() # Remove and return the first item from the queue
+        expanded += 1
 
-        Bc = copy.deepcopy(Bp)
-        Bc = set(Bc).intersection(set(G.nodes[vc]["features"]))
+        Bp = ber if Pp is None else Pp[2]
+        Bc = Bp & G.nodes[vc]["featureMask"]
 
-        if len(Bc) <= BglobalBestSCore:
+        if Bc.bit_count() <= BglobalBestSCore:
             # We can never become better than the best path, so might as well exit
             continue
 
+        Pc = (vc, Pp, Bc)
 
         if vc == PRO.as_destination:
-            if len(Bc) > BglobalBestSCore:
-                BglobalBestSCore = len(Bc)
-                Pb = copy.deepcopy(Pc)
+            if Bc.bit_count() > BglobalBestSCore:
+                BglobalBestSCore = Bc.bit_count()
+                Pb = linkPath(Pc)
+                if BglobalBestSCore == bestPossibleScore:
+                    # No path can do better, so the search is done
+                    break
 
             continue # Stop exploring after final node
 
@@ -226,26 +903,417 @@ def globalBFS(G, PRO):
         neighboursWithBERIntersectionScore = []
         neighbours = list(nx.neighbors(G, vc))
         for n in neighbours:
-            BERIntersectionScore = len(set(G.nodes[n]["features"]).intersection(Bc))
+            BERIntersectionScore = (G.nodes[n]["featureMask"] & Bc).bit_count()
             neighboursWithBERIntersectionScore.append([n, BERIntersectionScore])
 
         neighboursSortedOnDescendingScore = sorted(neighboursWithBERIntersectionScore, key=lambda x: x[1], reverse=True)
         neighboursSortedOnSCore = list(el[0] for el in neighboursSortedOnDescendingScore)
 
         for vi in neighboursSortedOnSCore:
-            viSatisfiesStrictRequirements = fulfillsStrictRequirements(G, PRO, vi)
-            if vi not in Pc and viSatisfiesStrictRequirements:
-                Q.append((vi, Pc, Bc))
+            viSatisfiesStrictRequirements = fulfillsStrictRequirements(G, strictMask, vi)
+            if viSatisfiesStrictRequirements and not linkContains(Pc, vi):
+                Q.append((vi, Pc))
 
     # print("g #BER:", BglobalBestSCore)
 
-    return Pb, BglobalBestSCore
+    if checkpointPath is not None and os.path.exists(checkpointPath):
+        os.remove(checkpointPath)
+
+    return Pb, BglobalBestSCore, True
+
+
+
+
+
+
+
+
+
+
+
+
+def globalBranchAndBound(G, PRO, seedLimits=[2, 3], deadline=None):
+    """Exact best-first version of globalBFS.
+
+    States are expanded from a priority queue ordered by an optimistic bound on the number of
+    BER they can still keep: the BER of the path so far, limited to the features for which the
+    last node can reach the destination through nodes supporting that feature. The incumbent
+    starts as the path MP finds with seedLimits, and every state whose bound cannot beat the
+    incumbent is dropped. As soon as the best bound in the queue cannot beat the incumbent
+    anymore, the incumbent is optimal.
+
+    Returns the same (path, #BER, optimal) as globalBFS, although on ties the path may differ.
+    Since there always is an incumbent, a search stopped by the deadline still returns a path
+    at least as good as the heuristic one.
+    """
+    if isOrderedList(PRO):
+        return globalLongestPrefix(G, PRO, deadline)
+
+    strictMask = buildStrictMask(G, PRO)
+
+    source = PRO.as_source
+    destination = PRO.as_destination
+
+    if not fulfillsStrictRequirements(G, strictMask, source) or not fulfillsStrictRequirements(G, strictMask, destination):
+        return [], -1, True
+
+    _, ber = requirementBits(PRO)
+    index = G.graph["csr"].index
+
+    # Seed the incumbent with the heuristic
+    Pb, BglobalBestSCore, _ = heuristicPath(G, PRO, seedLimits, strictMask, deadline)
+    if len(Pb) == 0:
+        return [], -1, True
+
+    if source == destination or BglobalBestSCore == berUpperBound(G, PRO).bit_count():
+        return Pb, BglobalBestSCore, True
+
+    reach = featureReachability(G, strictMask, destination, ber, deadline)
+    if reach is None:
+        return Pb, BglobalBestSCore, False
+
+    # Entries are (-bound, #hops, tiebreaker, node, walk, BER of walk)
+    startBER = ber & G.nodes[source]["featureMask"]
+    Q = [(-(startBER & reach[index[source]]).bit_count(), 1, 0, source, (source,), startBER)]
+    counter = 1
+    expanded = set()
+
+    while len(Q) > 0:
+        if deadlinePassed(deadline):
+            return Pb, BglobalBestSCore, False
+
+        negativeBound, hops, _, vc, Pc, Bc = heapq.heappop(Q)
+
+        if -negativeBound <= BglobalBestSCore:
+            # No state left in the queue can beat the incumbent
+            break
+
+        if (vc, Bc) in expanded:
+            continue
+        expanded.add((vc, Bc))
+
+        for vi in G.adj[vc]:
+            if not fulfillsStrictRequirements(G, strictMask, vi):
+                continue
+
+            Bi = Bc & G.nodes[vi]["featureMask"]
+
+            if vi == destination:
+                if Bi.bit_count() > BglobalBestSCore:
+                    BglobalBestSCore = Bi.bit_count()
+                    Pb = removeLoops(list(Pc) + [vi])
+                continue
 
+            bound = (Bi & reach[index[vi]]).bit_count()
+            if bound <= BglobalBestSCore or (vi, Bi) in expanded:
+                continue
 
+            heapq.heappush(Q, (-bound, hops + 1, counter, vi, Pc + (vi,), Bi))
+            counter += 1
 
+    return Pb, BglobalBestSCore, True
 
 
+def removeLoops(walk):
+    # Cut every loop out of a walk, which leaves a simple path over a subset of its nodes
+    path = []
+    position = {}
+    for node in walk:
+        if node in position:
+            for removed in path[position[node] + 1:]:
+                del position[removed]
+            path = path[:position[node] + 1]
+        else:
+            position[node] = len(path)
+            path.append(node)
+    return path
 
 
 
+class Label():
+    # A walk through the graph, stored as a pointer to the label it was extended from
+    __slots__ = ("node", "ber", "parent", "dominated")
+
+    def __init__(self, node, ber, parent):
+        self.node = node
+        self.ber = ber
+        self.parent = parent
+        self.dominated = False
+
+    def path(self):
+        walk = []
+        label = self
+        while label is not None:
+            walk.append(label.node)
+            label = label.parent
+        walk.reverse()
+        return removeLoops(walk)
+
+
+def globalLabelSetting(G, PRO, deadline=None):
+    """Label-setting version of globalBFS.
+
+    Every node keeps the BER of the walks that reached it that are not dominated by another
+    walk to that node: a walk whose BER is a subset of the BER of another walk to the same node
+    can never end in a better path, so it is discarded, and labels that become dominated by a
+    new label are not expanded anymore. Walks are stored as parent pointers, so extending one
+    does not copy it.
+
+    Like globalBranchAndBound, this searches over walks instead of simple paths, which gives the
+    same optimum, and returns the same (path, #BER, optimal) as globalBFS up to ties.
+    """
+    if isOrderedList(PRO):
+        return globalLongestPrefix(G, PRO, deadline)
+
+    strictMask = buildStrictMask(G, PRO)
+
+    if not fulfillsStrictRequirements(G, strictMask, PRO.as_source) or not fulfillsStrictRequirements(G, strictMask, PRO.as_destination):
+        return [], -1, True
+
+    _, ber = requirementBits(PRO)
+    bestPossibleScore = berUpperBound(G, PRO).bit_count()
+
+    BglobalBestSCore = -1
+    Lb = None
+
+    start = Label(PRO.as_source, ber & G.nodes[PRO.as_source]["featureMask"], None)
+    labels = {PRO.as_source: [start]}
+    Q = deque([start])
+
+    optimal = True
+    while len(Q) > 0:
+        if deadlinePassed(deadline):
+            optimal = False
+            break
+
+        label = Q.popleft()
+
+        if label.dominated or label.ber.bit_count() <= BglobalBestSCore:
+            continue
+
+        if label.node == PRO.as_destination:
+            BglobalBestSCore = label.ber.bit_count()
+            Lb = label
+            if BglobalBestSCore == bestPossibleScore:
+                # No path can do better, so the search is done
+                break
+            continue # Stop exploring after final node
+
+        for vi in G.adj[label.node]:
+            if not fulfillsStrictRequirements(G, strictMask, vi):
+                continue
+
+            Bi = label.ber & G.nodes[vi]["featureMask"]
+            if Bi.bit_count() <= BglobalBestSCore:
+                continue
+
+            existing = labels.setdefault(vi, [])
+            if any(Bi & ~other.ber == 0 for other in existing):
+                continue
+
+            # The new label dominates every existing label whose BER is a subset of its own
+            kept = []
+            for other in existing:
+                if other.ber & ~Bi == 0:
+                    other.dominated = True
+                else:
+                    kept.append(other)
+
+            newLabel = Label(vi, Bi, label)
+            kept.append(newLabel)
+            labels[vi] = kept
+            Q.append(newLabel)
+
+    if Lb is None:
+        return [], -1, optimal
+
+    return Lb.path(), BglobalBestSCore, optimal
+
+
+
+class ParetoLabel(Label):
+    # A walk with its number of nodes and total latency, see paretoFrontier
+    __slots__ = ("hops", "latency")
+
+    def __init__(self, node, ber, parent, hops, latency):
+        super().__init__(node, ber, parent)
+        self.hops = hops
+        self.latency = latency
+
+
+def paretoFrontier(G, PRO, maxPaths=None, deadline=None):
+    """All paths that are Pareto-optimal in (hops, total latency, #BER), under the strict requirements.
+
+    Multi-criteria version of globalLabelSetting: a walk is dominated by another walk to the same
+    node if it has at least as many hops, at least as much latency and a BER that is a subset of
+    the other's, and then discarded. Labels are expanded in order of (hops, latency), and a label
+    is also dropped as soon as a path on the frontier has at most its hops and latency and at
+    least its #BER, as extending a walk only adds hops and latency and shrinks the BER.
+
+    Returns (frontier, complete), where frontier is a list of (path, hops, latency, #BER) sorted by
+    hops, hops being len(path) as in the results of MP. The search stops early once the frontier
+    holds maxPaths paths or the deadline passes, in which case complete is False. As paths are
+    found in order of (hops, latency), the frontier is then still exact up to the last path found.
+    """
+    strictMask = buildStrictMask(G, PRO)
+
+    if not fulfillsStrictRequirements(G, strictMask, PRO.as_source) or not fulfillsStrictRequirements(G, strictMask, PRO.as_destination):
+        return [], True
+
+    csr = G.graph["csr"]
+    _, ber = requirementBits(PRO)
+
+    # Connections of every node expanded so far, as (neighbour, latency) pairs
+    connections = {}
+
+    # (hops, latency, #BER, label) of the paths found so far
+    frontier = []
+
+    def onFrontier(hops, latency, score):
+        return any(h <= hops and l <= latency and s >= score for h, l, s, _ in frontier)
+
+    start = ParetoLabel(PRO.as_source, ber & G.nodes[PRO.as_source]["featureMask"], None, 1, 0.0)
+    labels = {PRO.as_source: [start]}
+    # Ties in (hops, latency) are expanded biggest #BER first, such that the path kept at the
+    # destination for them is the best one
+    counter = 0
+    Q = [(start.hops, start.latency, -requirementScore(PRO, start.ber), counter, start)]
+
+    complete = True
+    while len(Q) > 0:
+        if deadlinePassed(deadline) or (maxPaths is not None and len(frontier) >= maxPaths):
+            complete = False
+            break
+
+        _, _, _, _, label = heapq.heappop(Q)
+
+        score = requirementScore(PRO, label.ber)
+        if label.dominated or onFrontier(label.hops, label.latency, score):
+            continue
+
+        if label.node == PRO.as_destination:
+            frontier.append((label.hops, label.latency, score, label))
+            continue # Stop exploring after final node
 
+        i = csr.index[label.node]
+        if i not in connections:
+            first, last = csr.indptr[i], csr.indptr[i + 1]
+            connections[i] = list(zip(csr.indices[first:last].tolist(), csr.latency[first:last].tolist()))
+
+        hops = label.hops + 1
+        for j, connectionLatency in connections[i]:
+            if not strictMask[j]:
+                continue
+
+            vi = csr.nodeIds[j]
+            Bi = label.ber & G.nodes[vi]["featureMask"]
+            latency = label.latency + connectionLatency
+            scoreI = requirementScore(PRO, Bi)
+            if onFrontier(hops, latency, scoreI):
+                continue
+
+            existing = labels.setdefault(vi, [])
+            if any(other.hops <= hops and other.latency <= latency and Bi & ~other.ber == 0 for other in existing):
+                continue
+
+            # The new label dominates every existing label that it is at least as good as in all three
+            kept = []
+            for other in existing:
+                if hops <= other.hops and latency <= other.latency and other.ber & ~Bi == 0:
+                    other.dominated = True
+                else:
+                    kept.append(other)
+
+            newLabel = ParetoLabel(vi, Bi, label, hops, latency)
+            kept.append(newLabel)
+            labels[vi] = kept
+            counter += 1
+            heapq.heappush(Q, (hops, latency, -scoreI, counter, newLabel))
+
+    return [(label.path(), hops, latency, score) for hops, latency, score, label in frontier], complete
+
+
+
+def globalSubsetLattice(G, PRO, seedLimits=[2, 3], deadline=None):
+    """Exact search over the subsets of the best effort requirements, like the archived Filterset.
+
+    A path keeping the set S of best effort requirements exists if and only if the destination can
+    be reached from the source through nodes supporting S (and the strict requirements), so the
+    optimum is the biggest such S. Subsets are checked biggest first, each with one BFS over a node
+    mask of the shared CSR graph instead of on a filtered copy of the graph, and the first subset
+    that can be kept is optimal.
+
+    Only features that can be kept on their own (by berUpperBound and a BFS per feature) are
+    considered, subsets containing a pair of features that cannot be kept together are skipped
+    without a BFS, and subsets no bigger than the path MP finds with seedLimits are never checked.
+    The number of checks therefore grows with the gap between that path and the optimum, which
+    makes this fast for small sets of BER.
+
+    Returns the same (path, #BER, optimal) as globalBFS, although on ties the path may differ.
+    """
+    if isOrderedList(PRO):
+        return globalLongestPrefix(G, PRO, deadline)
+
+    strictMask = buildStrictMask(G, PRO)
+
+    if not fulfillsStrictRequirements(G, strictMask, PRO.as_source) or not fulfillsStrictRequirements(G, strictMask, PRO.as_destination):
+        return [], -1, True
+
+    # Seed the incumbent with the heuristic
+    Pb, BglobalBestSCore, _ = heuristicPath(G, PRO, seedLimits, strictMask, deadline)
+    if len(Pb) == 0:
+        return [], -1, True
+
+    bound = berUpperBound(G, PRO)
+    if BglobalBestSCore == bound.bit_count():
+        return Pb, BglobalBestSCore, True
+
+    csr = G.graph["csr"]
+    source = csr.index[PRO.as_source]
+    destination = csr.index[PRO.as_destination]
+
+    def allowedNodes(subset):
+        return strictMask & csr.supportMask(subset)
+
+    def canBeKept(subset):
+        return csr.reachable(source, allowedNodes(subset))[destination]
+
+    # One BFS per feature, which adds up on big graphs
+    features = []
+    for f in decodeFeatures(bound):
+        if deadlinePassed(deadline):
+            return Pb, BglobalBestSCore, False
+        if canBeKept(1 << f):
+            features.append(f)
+
+    # conflicts[f] has bit g set if features f and g cannot be kept together, computed once the
+    # subsets to check outnumber the pairs
+    conflicts = None
+    numberOfPairs = len(features) * (len(features) - 1) // 2
+
+    for size in range(len(features), BglobalBestSCore, -1):
+        if conflicts is None and size < len(features) and math.comb(len(features), size) > numberOfPairs:
+            conflicts = {f: 0 for f in features}
+            for f, g in combinations(features, 2):
+                if deadlinePassed(deadline):
+                    return Pb, BglobalBestSCore, False
+                if not canBeKept(1 << f | 1 << g):
+                    conflicts[f] |= 1 << g
+                    conflicts[g] |= 1 << f
+
+        for subsetFeatures in combinations(features, size):
+            if deadlinePassed(deadline):
+                return Pb, BglobalBestSCore, False
+
+            subset = 0
+            for f in subsetFeatures:
+                subset |= 1 << f
+            if conflicts is not None and any(subset & conflicts[f] for f in subsetFeatures):
+                continue
+
+            allowed = allowedNodes(subset)
+            if csr.reachable(source, allowed)[destination]:
+                return bidirectionalBFSWithFilterCSR(G, PRO, allowed), size, True
+
+    # No subset bigger than the one of the incumbent can be kept
+    return Pb, BglobalBestSCore, True
@@ -0,0 +1,144 @@
+"""
+Long-lived path request service. The graph is loaded from a snapshot once, after which PROs
+are answered over a local Unix socket or TCP port without touching the disk again.
+
+Protocol: newline-delimited JSON in both directions. Every request line is an object
+
+    {"id": <anything>, "solver": "mp" | "global", "limits": [depthLimit, neighbourLimit], "budget_ms": <ms>, "pro": {<PRO>}}
+
+where "solver" defaults to "mp", "limits" to defaultLimits and "budget_ms" to defaultBudgetMs. A
+solver that runs out of its budget answers with the best path it found so far. Requests are solved in a pool of
+worker processes, so many can run at the same time, also over a single connection. Responses
+are streamed back as soon as they are done, which is not necessarily in the order the requests
+came in:
+
+    {"id": <id of the request>, "path": [...], "ber": <#BER>, "complete": <bool>, "solve_ms": ..., "latency_ms": ...}
+
+where complete is false if the solver was stopped by the budget (for "global" it means the path
+is proven optimal), and latency_ms is the time from receiving the request until its response was written.
+
+usage: python path_service.py <snapshot file> [<unix socket path> | <port>]
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from graph_snapshot import loadSnapshot
+from path_calculator import heuristicPath, globalBranchAndBound
+
+##########################################################################
+############# TWEAK HERE #################################################
+##########################################################################
+
+defaultLimits = [2, 3]
+defaultSocket = "/tmp/path_service.sock"
+host = "127.0.0.1"
+numberOfWorkers = os.cpu_count()
+defaultBudgetMs = None # no budget
+
+###########################################################################
+
+# Set in the parent before the workers are forked, such that every worker shares the same
+# graph memory copy-on-write instead of loading its own. The same holds for the indexes of the
+# CSR graph, which are therefore built before the fork too
+G = None
+
+
+def solve(request, deadline):
+    tic = time.time()
+
+    pro = json.loads(json.dumps(request["pro"]), object_hook=lambda pro_content: SimpleNamespace(**pro_content))
+    pro.as_source = str(pro.as_source)
+    pro.as_destination = str(pro.as_destination)
+
+    if pro.as_source not in G.graph["csr"].index or pro.as_destination not in G.graph["csr"].index:
+        raise ValueError("unknown source or destination")
+
+    if request.get("solver", "mp") == "global":
+        path, totalNrOfBER, complete = globalBranchAndBound(G, pro, deadline=deadline)
+    else:
+        path, totalNrOfBER, complete = heuristicPath(G, pro, request.get("limits", defaultLimits), deadline=deadline)
+
+    return {"path": path, "ber": totalNrOfBER, "complete": complete, "solve_ms": round((time.time() - tic) * 1000, 3)}
+
+
+async def handleRequest(line, writer, executor):
+    received = time.time()
+    response = {}
+    try:
+        request = json.loads(line)
+        response["id"] = request.get("id")
+        # The budget counts from receiving the request, so time spent waiting for a worker is included
+        budget = request.get("budget_ms", defaultBudgetMs)
+        deadline = received + budget / 1000 if budget is not None else None
+        result = await asyncio.get_running_loop().run_in_executor(executor, solve, request, deadline)
+        response.update(result)
+    except Exception as e:
+        response["error"] = str(e)
+
+    response["latency_ms"] = round((time.time() - received) * 1000, 3)
+    writer.write((json.dumps(response) + "\n").encode("utf-8"))
+    await writer.drain()
+
+    print(f"request {response.get('id')}: {response['latency_ms']} ms")
+
+
+async def handleConnection(reader, writer, executor):
+    pending = set()
+    while True:
+        line = await reader.readline()
+        if len(line) == 0:
+            break
+        if len(line.strip()) == 0:
+            continue
+        task = asyncio.create_task(handleRequest(line, writer, executor))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    # Finish the requests of this connection before closing it
+    if len(pending) > 0:
+        await asyncio.gather(*pending)
+    writer.close()
+
+
+async def serve(address, executor):
+    def onConnection(reader, writer):
+        return handleConnection(reader, writer, executor)
+
+    if address.isdigit():
+        server = await asyncio.start_server(onConnection, host, int(address))
+    else:
+        if os.path.exists(address):
+            os.remove(address)
+        server = await asyncio.start_unix_server(onConnection, address)
+
+    print("listening on", address)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    tic = time.time()
+    G = loadSnapshot(sys.argv[1]).toNetworkx()
+    print(f"loaded {len(G.nodes)} nodes in {round(time.time() - tic, 3)} s")
+
+    # The PROs are not known yet, so the components of every feature are built
+    tic = time.time()
+    csr = G.graph["csr"]
+    csr.featureNodes(0)
+    csr.buildFeatureComponents()
+    csr.latencyOrder()
+    print(f"built the feature indexes in {round(time.time() - tic, 3)} s")
+
+    # Fork all workers now, while G is loaded and before any client connection is open (forked
+    # workers would otherwise inherit the connection and keep it open after the parent closes it)
+    executor = ProcessPoolExecutor(max_workers=numberOfWorkers, mp_context=multiprocessing.get_context("fork"))
+    executor.submit(len, []).result()
+
+    address = sys.argv[2] if len(sys.argv) > 2 else defaultSocket
+    asyncio.run(serve(address, executor))
@@ -0,0 +1,91 @@
+"""
+Per-phase timers and search counters for MP.
+
+The solvers report to profiling.collector, which by default is a NullCollector that ignores
+everything. Install a PhaseCollector with setCollector to record where the time of a request
+goes. Hot loops keep their counts in local variables and report them once per call, so a
+disabled collector costs a few method calls per request.
+
+    profiling.setCollector(profiling.PhaseCollector())
+    MP(G, pro, limits)
+    print(profiling.collector.summary())
+"""
+
+import time
+
+# Phases and counters in the order they are written to CSV files
+PHASES = [
+    "strict_check",     # strict mask and the check of source and destination
+    "shortest_path",    # bidirectional BFS, or Dijkstra for PROs minimizing latency
+    "augment",          # all of augmentPathToBiggestSubset, so it includes the phases below
+    "window_scan",      # going over detour windows, without the detour searches themselves
+    "detour_search",    # find_best_detour (or find_detours)
+    "validation",       # nx.is_simple_path checks and rebuilding the intersection tables
+]
+
+COUNTERS = [
+    "bfs_nodes_expanded",   # nodes expanded by the BFS, or settled by Dijkstra
+    "windows_scanned",
+    "windows_skipped",
+    "detour_searches",
+    "half_detours",
+    "detours_enumerated",
+    "set_intersections",
+    "paths_spliced",
+]
+
+
+class NullCollector():
+    enabled = False
+
+    def start(self):
+        return 0
+
+    def stop(self, phase, started):
+        pass
+
+    def count(self, counter, amount=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def summary(self):
+        return {}
+
+
+class PhaseCollector():
+    """Sums the time spent per phase (in seconds) and the counters until reset."""
+
+    enabled = True
+
+    def __init__(self):
+        self.times = {}
+        self.counters = {}
+
+    def start(self):
+        return time.perf_counter()
+
+    def stop(self, phase, started):
+        self.times[phase] = self.times.get(phase, 0) + time.perf_counter() - started
+
+    def count(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def reset(self):
+        self.times = {}
+        self.counters = {}
+
+    def summary(self):
+        result = {phase: self.times.get(phase, 0) for phase in PHASES}
+        result.update({counter: self.counters.get(counter, 0) for counter in COUNTERS})
+        return result
+
+
+collector = NullCollector()
+
+
+def setCollector(newCollector):
+    """Install newCollector for every solver in this process, or switch profiling off with None."""
+    global collector
+    collector = newCollector if newCollector is not None else NullCollector()
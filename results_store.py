@@ -0,0 +1,115 @@
+"""
+Experiment results in one SQLite database per experiment directory, with one typed row per run,
+such that the stats scripts can load them as columns without parsing CSV fields.
+
+Tables:
+    heuristic_runs  one row per (graph_type, depth_limit, neighbour_limit, pro)
+    global_runs     one row per (graph_type, search, pro)
+
+Writing a run that is already in the database replaces it, so rerunning (part of) an experiment
+leaves the latest result per key. Phase timings and counters of heuristic runs are those of
+profiling.PHASES and profiling.COUNTERS, and are only meaningful for rows with profiled = 1.
+"""
+
+import os
+import sqlite3
+import numpy as np
+import profiling
+
+HEURISTIC_COLUMNS = [
+    ("graph_type", "TEXT"),
+    ("depth_limit", "INTEGER"),
+    ("neighbour_limit", "INTEGER"),
+    ("pro", "INTEGER"),
+    ("hops", "INTEGER"),
+    ("extra_hops", "INTEGER"),
+    ("ber", "INTEGER"),
+    ("improvement", "INTEGER"),
+    ("runtime", "REAL"),
+    ("pathfinder_time", "REAL"),
+    ("finished", "INTEGER"),
+    ("profiled", "INTEGER"),
+] + [(phase, "REAL") for phase in profiling.PHASES] + [(counter, "INTEGER") for counter in profiling.COUNTERS]
+
+GLOBAL_COLUMNS = [
+    ("graph_type", "TEXT"),
+    ("search", "TEXT"),
+    ("pro", "INTEGER"),
+    ("hops", "INTEGER"),
+    ("ber", "INTEGER"),
+    ("runtime", "REAL"),
+    ("optimal", "INTEGER"),
+]
+
+TABLES = {
+    "heuristic_runs": (HEURISTIC_COLUMNS, ["graph_type", "depth_limit", "neighbour_limit", "pro"]),
+    "global_runs": (GLOBAL_COLUMNS, ["graph_type", "search", "pro"]),
+}
+
+DTYPES = {"TEXT": object, "INTEGER": np.int64, "REAL": np.float64}
+
+
+class ResultsStore():
+
+    def __init__(self, databasePath):
+        os.makedirs(os.path.dirname(databasePath) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(databasePath)
+        for table, (columns, key) in TABLES.items():
+            definitions = ", ".join(f"{name} {kind} NOT NULL" for name, kind in columns)
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definitions}, PRIMARY KEY ({', '.join(key)}))")
+        self.connection.commit()
+
+    def addRows(self, table, rows):
+        """Insert (or replace) rows, given as dicts from column name to value, in one transaction."""
+        columns = [name for name, _ in TABLES[table][0]]
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                ([row[name] for name in columns] for row in rows),
+            )
+
+    def addHeuristicRuns(self, rows):
+        self.addRows("heuristic_runs", rows)
+
+    def addGlobalRuns(self, rows):
+        self.addRows("global_runs", rows)
+
+    def loadColumns(self, table, **where):
+        """All rows of table matching the keyword filters, as a dict from column name to NumPy array.
+
+        Rows are ordered by their key, e.g. loadColumns("heuristic_runs", graph_type="city").
+        """
+        columns, key = TABLES[table]
+        query = f"SELECT {', '.join(name for name, _ in columns)} FROM {table}"
+        if len(where) > 0:
+            query += " WHERE " + " AND ".join(f"{name} = ?" for name in where)
+        query += f" ORDER BY {', '.join(key)}"
+
+        rows = self.connection.execute(query, list(where.values())).fetchall()
+        values = list(zip(*rows)) if len(rows) > 0 else [[] for _ in columns]
+        return {name: np.array(column, dtype=DTYPES[kind]) for (name, kind), column in zip(columns, values)}
+
+    def close(self):
+        self.connection.close()
+
+
+def heuristicRow(graphType, limits, pro, result, profile):
+    """Row for heuristic_runs from the tuple MP returns and the profile summary (empty if not profiled)."""
+    hops, extraHops, ber, improvement, runtime, pathfinderTime, finished = result
+    row = {
+        "graph_type": graphType,
+        "depth_limit": limits[0],
+        "neighbour_limit": limits[1],
+        "pro": pro,
+        "hops": hops,
+        "extra_hops": extraHops,
+        "ber": ber,
+        "improvement": improvement,
+        "runtime": runtime,
+        "pathfinder_time": pathfinderTime,
+        "finished": int(finished),
+        "profiled": int(len(profile) > 0),
+    }
+    for name in profiling.PHASES + profiling.COUNTERS:
+        row[name] = profile.get(name, 0)
+    return row
@@ -0,0 +1,173 @@
+"""
+Stub pruning: route on the 2-core of the graph instead of the whole graph.
+
+AS graphs have many stubs, ASes with a single connection, and more generally trees that hang off
+the rest of the graph by a single node. A tree can only be entered and left through the node it
+hangs off (its root), so a simple path never passes through a tree: a tree node can only be the
+source or destination of a path, and then the path through the tree to the root is fixed.
+
+StubIndex peels the trees off once per graph, leaving the 2-core. At query time the tree paths
+of the source and destination are fixed, their features are intersected into the best effort
+requirements (and checked against the strict ones), and the search runs on the core between the
+roots. The tree paths are then put back around the path found on the core.
+
+    index = StubIndex(G)
+    path, ber, optimal = index.solve(globalBranchAndBound, pro, deadline=deadline)
+    hops, extraHops, ber, improvement, runtime, pathfinderTime, finished = index.MP(pro, limits)
+"""
+
+import time
+from collections import deque
+from types import SimpleNamespace
+import numpy as np
+from feature_bits import requirementBits, requirementScore
+from path_calculator import MP, MP_sweep
+
+
+class StubIndex():
+
+    def __init__(self, G):
+        self.G = G
+        # Node towards the core of every peeled node, None for the last node of a tree without a core
+        self.parent = {}
+
+        # Peel nodes of degree 1 (and isolated nodes) until only the 2-core is left
+        degree = dict(G.degree)
+        peelable = deque(node for node in G.nodes if degree[node] <= 1)
+        while peelable:
+            node = peelable.popleft()
+            if node in self.parent:
+                continue
+            self.parent[node] = None
+            for other in G.adj[node]:
+                if other not in self.parent:
+                    self.parent[node] = other
+                    degree[other] -= 1
+                    if degree[other] == 1:
+                        peelable.append(other)
+
+        self.core = G.subgraph(node for node in G.nodes if node not in self.parent).copy()
+        # Sliced from the CSRGraph of G, such that the searches see the neighbours in the same order
+        csr = G.graph["csr"]
+        self.core.graph["csr"] = csr.subgraph(np.array([asn not in self.parent for asn in csr.nodeIds], dtype=bool))
+
+    def treePath(self, node):
+        """The path from node to the core node its tree hangs off, ending in None if there is none."""
+        path = [node]
+        while path[-1] in self.parent:
+            path.append(self.parent[path[-1]])
+        return path
+
+    def reduce(self, pro):
+        """Split a PRO into the tree paths of its endpoints and a PRO between their roots.
+
+        Returns (sourceTree, coreProOrPath, destinationTree), where sourceTree runs from the source
+        to its root and destinationTree from the root of the destination to the destination. If
+        the whole path is fixed by the trees, the middle item is that path instead of a PRO, and
+        it is None when the trees do not fulfill the strict requirements. Returns None if the PRO
+        has to be solved on the whole graph, which is when an endpoint is in a tree without a core.
+        """
+        sourceTree = self.treePath(pro.as_source)
+        destinationTree = self.treePath(pro.as_destination)
+        if sourceTree[-1] is None or destinationTree[-1] is None:
+            return None
+
+        strictBits, bestEffortBits = requirementBits(pro)
+        if sourceTree[-1] == destinationTree[-1]:
+            # Both in the same tree (or a tree and its root): the path is the one through the tree
+            while len(sourceTree) > 1 and len(destinationTree) > 1 and sourceTree[-2] == destinationTree[-2]:
+                sourceTree.pop()
+                destinationTree.pop()
+            path = sourceTree + destinationTree[-2::-1]
+            if any(strictBits & ~self.G.nodes[node]["featureMask"] for node in path):
+                return sourceTree, None, []
+            return [], path, []
+
+        # The roots themselves are on the path the search on the core finds, so they are left to it
+        treeNodes = sourceTree[:-1] + destinationTree[:-1]
+        for node in treeNodes:
+            featureMask = self.G.nodes[node]["featureMask"]
+            if strictBits & ~featureMask:
+                return sourceTree, None, destinationTree[::-1]
+            bestEffortBits &= featureMask
+
+        requirements = SimpleNamespace(**vars(pro.requirements))
+        if getattr(pro.requirements, "best_effort_mode", "biggest_subset") == "ordered_list":
+            # A feature the trees do not keep ends the prefix any path can keep
+            requirements.best_effort = pro.requirements.best_effort[:requirementScore(pro, bestEffortBits)]
+        else:
+            requirements.best_effort = [f for f in pro.requirements.best_effort if bestEffortBits >> f & 1]
+        # The cached masks belong to the original requirements
+        for cached in ["strictBits", "bestEffortBits"]:
+            requirements.__dict__.pop(cached, None)
+
+        corePro = SimpleNamespace(**vars(pro))
+        corePro.as_source = sourceTree[-1]
+        corePro.as_destination = destinationTree[-1]
+        corePro.requirements = requirements
+        return sourceTree, corePro, destinationTree[::-1]
+
+    def solve(self, search, pro, **kwargs):
+        """Run a search that returns (path, #BER, flag), like globalBFS, on the core.
+
+        Falls back to running the search on the whole graph for PROs that reduce() cannot split.
+        """
+        reduced = self.reduce(pro)
+        if reduced is None:
+            return search(self.G, pro, **kwargs)
+
+        sourceTree, corePro, destinationTree = reduced
+        if corePro is None:
+            # Same as the searches return when no path fulfills the strict requirements
+            return [], -1, True
+        if isinstance(corePro, list):
+            _, bestEffortBits = requirementBits(pro)
+            for node in corePro:
+                bestEffortBits &= self.G.nodes[node]["featureMask"]
+            return corePro, requirementScore(pro, bestEffortBits), True
+
+        path, ber, flag = search(self.core, corePro, **kwargs)
+        if not path:
+            return path, ber, flag
+        return sourceTree[:-1] + path + destinationTree[1:], ber, flag
+
+    def MP(self, pro, limits, deadline=None):
+        """MP on the core, returning the same statistics as MP on the whole graph."""
+        return self.heuristic(pro, lambda graph, pro: [MP(graph, pro, limits, deadline)])[0]
+
+    def MP_sweep(self, pro, limitsList):
+        return self.heuristic(pro, lambda graph, pro: MP_sweep(graph, pro, limitsList), len(limitsList))
+
+    def heuristic(self, pro, run, numberOfResults=1):
+        # run(graph, pro) returns a list of numberOfResults MP tuples
+        tic = time.time()
+        reduced = self.reduce(pro)
+        if reduced is None:
+            return run(self.G, pro)
+
+        # MP tells endpoints failing the strict requirements apart from there being no path at all
+        strictBits, _ = requirementBits(pro)
+        if any(strictBits & ~self.G.nodes[node]["featureMask"] for node in [pro.as_source, pro.as_destination]):
+            return [(0, 0, 0)] * numberOfResults
+
+        sourceTree, corePro, destinationTree = reduced
+        if corePro is None:
+            return [([], 0, time.time() - tic)] * numberOfResults
+        if isinstance(corePro, list):
+            _, bestEffortBits = requirementBits(pro)
+            for node in corePro:
+                bestEffortBits &= self.G.nodes[node]["featureMask"]
+            # Nothing to augment, the tree path is the only path
+            return [(len(corePro), 0, requirementScore(pro, bestEffortBits), 0, time.time() - tic, 0, True)] * numberOfResults
+
+        reduceTime = time.time() - tic
+        treeHops = len(sourceTree) - 1 + len(destinationTree) - 1
+        results = []
+        for result in run(self.core, corePro):
+            if len(result) < 7:
+                # No path on the core, or a root failing the strict requirements
+                results.append(([], 0, time.time() - tic))
+                continue
+            hops, extraHops, ber, improvement, runtime, pathfinderTime, finished = result
+            results.append((hops + treeHops, extraHops, ber, improvement, runtime + reduceTime, pathfinderTime, finished))
+        return results
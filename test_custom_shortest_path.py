@@ -0,0 +1,49 @@
+import random
+from types import SimpleNamespace
+import networkx as nx
+import pytest
+from csr_graph import CSRGraph
+from custom_shortest_path import bidirectionalLatencyWithFilterCSR
+from feature_bits import addFeatureMasks
+
+
+def randomGraph(rng, shape):
+    n = rng.randint(2, 30)
+    if shape == "path":
+        G = nx.path_graph(n)
+    elif shape == "tree":
+        G = nx.random_labeled_tree(n, seed=rng.randrange(10**9)) if hasattr(nx, "random_labeled_tree") else nx.random_tree(n, seed=rng.randrange(10**9))
+    else:
+        G = nx.gnp_random_graph(n, rng.uniform(0.05, 0.5), seed=rng.randrange(10**9))
+    G = nx.relabel_nodes(G, {node: str(node) for node in G})
+    for node in G:
+        # Feature 0 is the strict requirement, which most nodes support
+        G.nodes[node]["features"] = [0] if rng.random() < 0.8 else [1]
+    for u, v in G.edges:
+        # Whole numbers, which float32 latencies keep exactly
+        G.edges[u, v]["latency"] = rng.randint(0, 20)
+    addFeatureMasks(G)
+    G.graph["csr"] = CSRGraph.fromNetworkx(G)
+    return G
+
+
+@pytest.mark.parametrize("shape", ["path", "tree", "random"])
+def test_latency_search_matches_dijkstra_on_the_strict_subgraph(shape):
+    rng = random.Random(shape)
+    for _ in range(300):
+        G = randomGraph(rng, shape)
+        source, destination = rng.choice(list(G)), rng.choice(list(G))
+        pro = SimpleNamespace(as_source=source, as_destination=destination, path_optimization="minimize_total_latency",
+                              requirements=SimpleNamespace(strict=[0], best_effort=[]))
+
+        path = bidirectionalLatencyWithFilterCSR(G, pro)
+
+        strictNodes = [node for node in G if 0 in G.nodes[node]["features"]]
+        H = G.subgraph(strictNodes)
+        if source not in H or destination not in H or not nx.has_path(H, source, destination):
+            assert path == []
+            continue
+        assert path[0] == source and path[-1] == destination
+        assert len(set(path)) == len(path)
+        assert all(node in H for node in path)
+        assert sum(G.edges[u, v]["latency"] for u, v in zip(path, path[1:])) == nx.dijkstra_path_length(H, source, destination, weight="latency")
@@ -0,0 +1,90 @@
+import json
+import os
+import random
+import networkx as nx
+from csr_graph import CSRGraph
+from feature_bits import encodeFeatures
+from graph_snapshot import compileSnapshot, loadSnapshot, writeSnapshot
+
+
+def writeNIOFiles(directory, seed):
+    # Random NIO files in which some connections are listed by one side only, and some ASes only as a connection
+    rng = random.Random(seed)
+    asns = [str(rng.randrange(1, 100000)) for _ in range(40)]
+    asns = list(dict.fromkeys(asns))
+    withFile = asns[:30]
+    for asn in withFile:
+        connections = rng.sample(asns, rng.randint(1, 5))
+        nio = {
+            "as_number": asn,
+            "connections": connections,
+            "latency": [rng.randint(1, 50) for _ in connections],
+            "features": rng.sample(range(70), rng.randint(0, 10)),
+        }
+        with open(os.path.join(directory, f"{asn}.json"), "w") as file:
+            json.dump(nio, file)
+
+
+def directGraph(directory):
+    # As main.py builds the graph without a snapshot
+    as_numbers = []
+    node_info = {}
+    edges = []
+    edge_info = {}
+    for _, _, files in os.walk(directory):
+        for file in files:
+            with open(os.path.join(directory, file)) as nio_file:
+                nio_object = json.load(nio_file)
+            here = nio_object["as_number"]
+            as_numbers.append(here)
+            node_info[here] = {"features": nio_object["features"], "featureMask": encodeFeatures(nio_object["features"])}
+            for index, other in enumerate(nio_object["connections"]):
+                if (here, other) in edge_info or (other, here) in edge_info:
+                    continue
+                edge_info[(here, other)] = {"latency": nio_object["latency"][index]}
+                edges.append([here, other, edge_info[(here, other)]])
+    G = nx.Graph()
+    G.add_nodes_from(as_numbers)
+    nx.set_node_attributes(G, node_info)
+    G.add_edges_from(edges)
+    G.graph["csr"] = CSRGraph.fromNetworkx(G)
+    return G
+
+
+def assertSameOrder(G, H):
+    assert list(G) == list(H)
+    for node in G:
+        assert list(G.adj[node]) == list(H.adj[node])
+
+
+def test_snapshot_keeps_the_order_of_the_direct_build(tmp_path):
+    for seed in range(5):
+        directory = tmp_path / f"nio_{seed}"
+        directory.mkdir()
+        writeNIOFiles(directory, seed)
+
+        G = directGraph(directory)
+        compileSnapshot(str(directory), str(tmp_path / f"{seed}.snap"))
+        H = loadSnapshot(str(tmp_path / f"{seed}.snap")).toNetworkx()
+
+        assertSameOrder(G, H)
+        assert (G.graph["csr"].indices == H.graph["csr"].indices).all()
+        assert (G.graph["csr"].latency == H.graph["csr"].latency).all()
+        for node in G:
+            if "featureMask" in G.nodes[node]:
+                assert G.nodes[node]["featureMask"] == H.nodes[node]["featureMask"]
+
+
+def test_snapshot_round_trip_keeps_the_order(tmp_path):
+    G = nx.powerlaw_cluster_graph(200, 3, 0.1, seed=1)
+    G = nx.relabel_nodes(G, {node: str(node) for node in G})
+    nodes = list(G)
+    random.Random(1).shuffle(nodes)
+    shuffled = nx.Graph()
+    shuffled.add_nodes_from((node, {"features": [int(node) % 7]}) for node in nodes)
+    shuffled.add_edges_from(random.Random(2).sample(list(G.edges), G.number_of_edges()))
+
+    writeSnapshot(CSRGraph.fromNetworkx(shuffled), str(tmp_path / "graph.snap"))
+    H = loadSnapshot(str(tmp_path / "graph.snap")).toNetworkx()
+
+    assertSameOrder(shuffled, H)